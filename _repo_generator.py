@@ -6,25 +6,37 @@ Generates addons.xml, addons.xml.md5, and addon zip files for GitHub Pages hosti
 Based on drinfernoo/repository.example pattern.
 
 Usage:
-    python _repo_generator.py
+    python _repo_generator.py [--incremental] [--jobs N] [--reproducible]
 
 Output:
     Creates zips/ directory containing:
     - addons.xml (combined addon metadata)
     - addons.xml.md5 (checksum)
     - {addon_id}/{addon_id}-{version}.zip (per addon)
+    - .content-manifest.json (content hash per addon, used by --incremental)
 """
 
 from __future__ import annotations
 
+import argparse
 import hashlib
+import json
+import os
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Optional, List
+from typing import Any, Optional, List, Dict
 import xml.etree.ElementTree as ET
 import shutil
 import sys
 
+# Shared archive helpers live in the wizard library
+WIZARD_LIB = Path(__file__).resolve().parent / "omega" / "plugin.program.jodisbuildwizard" / "resources" / "lib"
+sys.path.insert(0, str(WIZARD_LIB))
+
+import archive  # noqa: E402
+
 # Source directories containing addon folders (relative to script)
 SOURCE_DIRS = ["omega"]
 
@@ -42,6 +54,45 @@ EXCLUDE_PATTERNS = [
     "zips",
 ]
 
+# Content hash manifest written alongside addons.xml
+CONTENT_MANIFEST = ".content-manifest.json"
+
+# Bump when zip layout changes so incremental runs rebuild everything
+MANIFEST_VERSION = 2
+
+# Read buffer for content hashing
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def compile_exclude_patterns(patterns: List[str]) -> archive.PathMatcher:
+    """
+    Compile EXCLUDE_PATTERNS into a case-insensitive path matcher.
+    
+    Bare names match a path component anywhere (and prune that directory);
+    "*" patterns match the end of the path.
+    
+    Args:
+        patterns: Exclusion patterns
+        
+    Returns:
+        Compiled matcher
+    """
+    globs = []
+
+    for pattern in patterns:
+        if pattern.startswith("*"):
+            globs.append(pattern)
+        else:
+            globs.extend([pattern, f"{pattern}/*", f"*/{pattern}", f"*/{pattern}/*"])
+
+    return archive.PathMatcher(globs, ignore_case=True)
+
+
+EXCLUDE_MATCHER = compile_exclude_patterns(EXCLUDE_PATTERNS)
+
+# Store already-compressed media, deflate text at a higher level
+COMPRESSION = archive.CompressionPolicy()
+
 
 def should_exclude(path: str) -> bool:
     """
@@ -53,18 +104,21 @@ def should_exclude(path: str) -> bool:
     Returns:
         True if path should be excluded
     """
-    path_lower = path.lower()
+    return EXCLUDE_MATCHER.match(path.replace("\\", "/"))
+
+
+def iter_addon_files(addon_dir: Path) -> List[tuple]:
+    """
+    List files to package for an addon, skipping excluded paths.
     
-    for pattern in EXCLUDE_PATTERNS:
-        if pattern.startswith("*"):
-            if path_lower.endswith(pattern[1:]):
-                return True
-        elif pattern.lower() in path_lower.split("/"):
-            return True
-        elif pattern.lower() in path_lower.split("\\"):
-            return True
-            
-    return False
+    Args:
+        addon_dir: Source addon directory
+        
+    Returns:
+        List of (DirEntry, archive path) tuples; archive paths include
+        the addon folder name
+    """
+    return list(archive.walk_files(addon_dir, f"{addon_dir.name}/", EXCLUDE_MATCHER))
 
 
 def parse_addon_xml(addon_dir: Path) -> Optional[ET.Element]:
@@ -90,13 +144,112 @@ def parse_addon_xml(addon_dir: Path) -> Optional[ET.Element]:
         return None
 
 
-def create_addon_zip(addon_dir: Path, output_dir: Path) -> Optional[Path]:
+def hash_addon_dir(addon_dir: Path) -> str:
+    """
+    Compute content hash of the files that would be zipped for an addon.
+    
+    Covers relative paths and file contents in sorted order, so renames,
+    additions and deletions all change the hash.
+    
+    Args:
+        addon_dir: Source addon directory
+        
+    Returns:
+        Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+
+    for file_path, rel_path_str in sorted(iter_addon_files(addon_dir), key=lambda f: f[1]):
+        digest.update(rel_path_str.encode("utf-8") + b"\0")
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+def load_content_manifest(zips_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Load content hash manifest from a previous run.
+    
+    Args:
+        zips_dir: Output zips directory
+        
+    Returns:
+        Mapping of addon_id -> {"version", "hash", "zip"}, empty if missing
+        or written by an incompatible generator version
+    """
+    manifest_path = zips_dir / CONTENT_MANIFEST
+
+    if not manifest_path.exists():
+        return {}
+
+    try:
+        data = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"  WARNING: Ignoring unreadable {CONTENT_MANIFEST}: {e}")
+        return {}
+
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+
+    return data.get("addons", {})
+
+
+def write_content_manifest(zips_dir: Path, addons: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Write content hash manifest for the next incremental run.
+    
+    Args:
+        zips_dir: Output zips directory
+        addons: Mapping of addon_id -> {"version", "hash", "zip"}
+    """
+    manifest = {"version": MANIFEST_VERSION, "addons": addons}
+    manifest_path = zips_dir / CONTENT_MANIFEST
+    manifest_path.write_text(
+        json.dumps(manifest, indent=2, sort_keys=True) + "\n",
+        encoding="utf-8"
+    )
+
+
+def remove_stale_outputs(zips_dir: Path, manifest: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Remove zips for addons or versions no longer present in the source.
+    
+    Args:
+        zips_dir: Output zips directory
+        manifest: Current addon_id -> {"version", "hash", "zip"} mapping
+    """
+    for addon_output in zips_dir.iterdir():
+        if not addon_output.is_dir():
+            continue
+
+        entry = manifest.get(addon_output.name)
+        if entry is None:
+            shutil.rmtree(addon_output)
+            print(f"  Removed: {addon_output.name}/")
+            continue
+
+        for zip_file in addon_output.glob("*.zip"):
+            if zip_file.name != entry["zip"]:
+                zip_file.unlink()
+                print(f"  Removed: {zip_file.name}")
+
+
+def create_addon_zip(
+    addon_dir: Path,
+    output_dir: Path,
+    reproducible: bool = False
+) -> Optional[Path]:
     """
     Create versioned zip file for addon.
     
     Args:
         addon_dir: Source addon directory
         output_dir: Base output directory for zips
+        reproducible: Write members in sorted order with normalised
+            timestamps, permissions and compression level
         
     Returns:
         Path to created zip file or None on failure
@@ -121,29 +274,88 @@ def create_addon_zip(addon_dir: Path, output_dir: Path) -> Optional[Path]:
 
     print(f"  Creating: {zip_name}")
 
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        for file_path in addon_dir.rglob("*"):
-            if not file_path.is_file():
-                continue
+    files_to_add = iter_addon_files(addon_dir)
+    stats = archive.CompressionStats()
+    date_time = None
 
-            # Archive path includes addon folder name
-            rel_path = file_path.relative_to(addon_dir.parent)
-            rel_path_str = str(rel_path).replace("\\", "/")
+    if reproducible:
+        files_to_add.sort(key=lambda f: f[1])
+        date_time = archive.reproducible_date_time()
 
-            if should_exclude(rel_path_str):
-                continue
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for file_path, arc_name in files_to_add:
+            archive.write_member(zf, file_path, arc_name, COMPRESSION, stats, date_time)
 
-            zf.write(file_path, rel_path)
+    print(f"    {zip_name}: {stats.summary()}")
 
     return zip_path
 
 
-def generate_addons_xml(source_dir: Path) -> int:
+def package_addon(
+    addon_dir: Path,
+    zips_dir: Path,
+    previous: Optional[Dict[str, Any]] = None,
+    reproducible: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Hash and zip a single addon, reusing the previous zip when unchanged.
+    
+    Self-contained so it can run in a worker process.
+    
+    Args:
+        addon_dir: Source addon directory
+        zips_dir: Base output directory for zips
+        previous: Manifest entry from the last run, if any
+        reproducible: Build a reproducible zip (see create_addon_zip)
+        
+    Returns:
+        Manifest entry {"version", "hash", "zip", "reproducible"} or
+        None on failure
+    """
+    addon_xml = parse_addon_xml(addon_dir)
+    if addon_xml is None:
+        return None
+
+    addon_id = addon_xml.get("id")
+    version = addon_xml.get("version")
+
+    content_hash = hash_addon_dir(addon_dir)
+    zip_name = f"{addon_id}-{version}.zip"
+
+    if (
+        previous is not None
+        and previous.get("hash") == content_hash
+        and previous.get("zip") == zip_name
+        and previous.get("reproducible", False) == reproducible
+        and (zips_dir / addon_id / zip_name).exists()
+    ):
+        print(f"  Unchanged: {zip_name}")
+    elif create_addon_zip(addon_dir, zips_dir, reproducible) is None:
+        return None
+
+    return {
+        "version": version,
+        "hash": content_hash,
+        "zip": zip_name,
+        "reproducible": reproducible,
+    }
+
+
+def generate_addons_xml(
+    source_dir: Path,
+    incremental: bool = False,
+    jobs: int = 1,
+    reproducible: bool = False
+) -> int:
     """
     Generate addons.xml and zip files for all addons in source directory.
     
     Args:
         source_dir: Directory containing addon folders
+        incremental: Reuse existing zips for addons whose content hash
+            matches the previous run instead of rebuilding everything
+        jobs: Number of worker processes used to package addons
+        reproducible: Build byte-stable zips (see create_addon_zip)
         
     Returns:
         Number of addons processed
@@ -152,15 +364,22 @@ def generate_addons_xml(source_dir: Path) -> int:
 
     zips_dir = source_dir / "zips"
     
-    # Clean existing zips directory
-    if zips_dir.exists():
-        shutil.rmtree(zips_dir)
-    zips_dir.mkdir()
-
+    if incremental and zips_dir.exists():
+        previous = load_content_manifest(zips_dir)
+    else:
+        # Clean existing zips directory
+        previous = {}
+        if zips_dir.exists():
+            shutil.rmtree(zips_dir)
+        zips_dir.mkdir()
+
+    manifest: Dict[str, Dict[str, Any]] = {}
     addons_root = ET.Element("addons")
     addon_count = 0
 
-    # Process each subdirectory
+    # Collect addon subdirectories in a fixed order
+    addons: List[tuple] = []
+
     for item in sorted(source_dir.iterdir()):
         if not item.is_dir():
             continue
@@ -175,12 +394,36 @@ def generate_addons_xml(source_dir: Path) -> int:
         version = addon_xml.get("version")
         
         print(f"  Found: {addon_id} v{version}")
-
-        # Create addon zip
-        zip_path = create_addon_zip(item, zips_dir)
-        if zip_path is None:
+        addons.append((item, addon_xml))
+
+    addon_dirs = [item for item, _ in addons]
+    previous_entries = [previous.get(addon_xml.get("id")) for _, addon_xml in addons]
+
+    # Package addons; map() keeps results in input order either way
+    if jobs > 1 and len(addons) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(
+                package_addon,
+                addon_dirs,
+                repeat(zips_dir),
+                previous_entries,
+                repeat(reproducible)
+            ))
+    else:
+        results = list(map(
+            package_addon,
+            addon_dirs,
+            repeat(zips_dir),
+            previous_entries,
+            repeat(reproducible)
+        ))
+
+    for (item, addon_xml), entry in zip(addons, results):
+        if entry is None:
             continue
 
+        manifest[addon_xml.get("id")] = entry
+
         # Add to combined addons.xml
         addons_root.append(addon_xml)
         addon_count += 1
@@ -202,6 +445,10 @@ def generate_addons_xml(source_dir: Path) -> int:
     md5_path.write_text(md5_hash)
     print(f"  Generated: addons.xml.md5 ({md5_hash})")
 
+    if incremental:
+        remove_stale_outputs(zips_dir, manifest)
+    write_content_manifest(zips_dir, manifest)
+
     return addon_count
 
 
@@ -323,6 +570,28 @@ def main() -> int:
     Returns:
         Exit code (0 = success)
     """
+    parser = argparse.ArgumentParser(
+        description="Generate Kodi repository addons.xml and addon zips"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-zip addons whose content changed since the last run"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=archive.job_count,
+        default=1,
+        help="Worker processes for addon packaging (0 = all CPUs, default: 1)"
+    )
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Write byte-stable zips (sorted members, fixed timestamps; "
+             "honours SOURCE_DATE_EPOCH)"
+    )
+    args = parser.parse_args()
+
     script_dir = Path(__file__).parent.resolve()
 
     print("=" * 60)
@@ -338,7 +607,12 @@ def main() -> int:
             print(f"\nWARNING: Source directory not found: {source_name}/")
             continue
 
-        addon_count = generate_addons_xml(source_dir)
+        addon_count = generate_addons_xml(
+            source_dir,
+            incremental=args.incremental,
+            jobs=args.jobs,
+            reproducible=args.reproducible
+        )
         total_addons += addon_count
 
     # Copy repository zip to root
@@ -0,0 +1,589 @@
+"""
+Zip archive helpers shared by the wizard and the repository build scripts.
+Standard library only, so the scripts can import it outside Kodi.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import hashlib
+import os
+import re
+import shutil
+import time
+import zipfile
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+# Zip epoch, used when SOURCE_DATE_EPOCH is not set
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+# Normalised member attributes for reproducible archives
+REPRODUCIBLE_FILE_MODE = 0o644
+
+# Unix create_system so attributes do not depend on the packaging host
+ZIP_SYSTEM_UNIX = 3
+
+COPY_BUFFER_SIZE = 1024 * 1024  # 1MB read/write buffer
+
+# The wizard's own addon_data folder
+WIZARD_DATA = "userdata/addon_data/plugin.program.jodisbuildwizard"
+
+# Per-file build manifest, embedded in build zips and published beside them
+MANIFEST_MEMBER = f"{WIZARD_DATA}/build_manifest.json"
+MANIFEST_FORMAT = 1
+
+# Files the wizard keeps about the machine it runs on. Builds never ship
+# them: the manifest is generated per build, the rest describe whichever
+# build the packaging machine last installed.
+WIZARD_STATE_MEMBERS = [
+    MANIFEST_MEMBER,
+    f"{WIZARD_DATA}/install_state.json",
+    f"{WIZARD_DATA}/extract_index.json",
+]
+
+# Already-compressed formats; deflating them burns CPU for no size gain
+STORED_EXTENSIONS = frozenset({
+    ".png", ".jpg", ".jpeg", ".gif", ".webp",
+    ".zip", ".gz", ".bz2", ".xz", ".7z", ".apk",
+    ".xbt", ".mp3", ".mp4", ".mkv", ".m4a", ".ogg", ".flac",
+})
+
+# Per-extension deflate levels; text compresses well and is worth the effort
+DEFAULT_LEVELS = {
+    ".py": 9,
+    ".xml": 9,
+    ".json": 9,
+    ".po": 9,
+    ".txt": 9,
+}
+
+DEFAULT_COMPRESS_LEVEL = 6
+
+# Stored members sampled to estimate what storing cost and saved
+SAMPLE_EVERY = 16
+SAMPLE_SIZE = 64 * 1024
+
+
+class PathMatcher:
+    """
+    fnmatch-style patterns compiled into a single regular expression.
+
+    Patterns are matched against forward-slash relative paths. Patterns
+    ending in "/*" also exclude the directory itself, which lets walkers
+    prune it instead of visiting every file below.
+    """
+
+    def __init__(self, patterns: Iterable[str], ignore_case: bool = False) -> None:
+        patterns = list(patterns)
+        flags = re.IGNORECASE if ignore_case else 0
+
+        self.patterns = patterns
+        self._file_re = self._compile(patterns, flags)
+        self._dir_re = self._compile(
+            [p[:-2] for p in patterns if p.endswith("/*")],
+            flags
+        )
+
+    @staticmethod
+    def _compile(patterns: Iterable[str], flags: int) -> Optional[re.Pattern]:
+        parts = [f"(?:{fnmatch.translate(p)})" for p in patterns]
+        if not parts:
+            return None
+        return re.compile("|".join(parts), flags)
+
+    def match(self, rel_path: str) -> bool:
+        """Check if a file path matches any pattern."""
+        return self._file_re is not None and self._file_re.match(rel_path) is not None
+
+    def match_dir(self, rel_path: str) -> bool:
+        """Check if everything below a directory is excluded."""
+        return self._dir_re is not None and self._dir_re.match(rel_path) is not None
+
+
+def walk_files(
+    root: Path,
+    prefix: str = "",
+    matcher: Optional[PathMatcher] = None
+) -> Iterator[Tuple[os.DirEntry, str]]:
+    """
+    Walk files below root with os.scandir, pruning excluded directories.
+
+    Args:
+        root: Directory to walk
+        prefix: Prepended to relative paths before matching, e.g. "addons/"
+        matcher: Exclusion patterns applied to prefixed relative paths
+
+    Yields:
+        (DirEntry, prefixed relative path) for each included file
+    """
+    stack = [(str(root), prefix)]
+
+    while stack:
+        dir_path, rel_dir = stack.pop()
+
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        for entry in entries:
+            rel_path = rel_dir + entry.name
+
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+
+            if is_dir:
+                if matcher is None or not matcher.match_dir(rel_path):
+                    stack.append((entry.path, rel_path + "/"))
+            elif matcher is None or not matcher.match(rel_path):
+                yield entry, rel_path
+
+
+class CompressionPolicy:
+    """
+    Chooses store vs deflate, and the deflate level, per archive member.
+    """
+
+    def __init__(
+        self,
+        default_level: int = DEFAULT_COMPRESS_LEVEL,
+        levels: Optional[Dict[str, int]] = None,
+        stored_extensions: Iterable[str] = STORED_EXTENSIONS
+    ) -> None:
+        """
+        Args:
+            default_level: Deflate level for extensions not in levels
+            levels: Extension (".xml") -> deflate level overrides
+            stored_extensions: Extensions written without compression
+        """
+        self.default_level = default_level
+        self.levels = DEFAULT_LEVELS if levels is None else levels
+        self.stored_extensions = frozenset(stored_extensions)
+
+    def select(self, name: str) -> Tuple[int, Optional[int]]:
+        """
+        Get compression for a member.
+
+        Args:
+            name: Member or file name
+
+        Returns:
+            (compress_type, compress_level); level is None when stored
+        """
+        ext = os.path.splitext(name)[1].lower()
+
+        if ext in self.stored_extensions:
+            return zipfile.ZIP_STORED, None
+
+        return zipfile.ZIP_DEFLATED, self.levels.get(ext, self.default_level)
+
+
+class CompressionStats:
+    """
+    Tracks what a CompressionPolicy did while writing an archive.
+
+    A sample of stored members is deflated in memory to estimate the
+    time saved and the size given up by not compressing them.
+    """
+
+    def __init__(self, sample_level: int = DEFAULT_COMPRESS_LEVEL) -> None:
+        self.sample_level = sample_level
+        self.deflated_files = 0
+        self.deflated_bytes = 0
+        self.deflated_out = 0
+        self.stored_files = 0
+        self.stored_bytes = 0
+        self.seconds = 0.0
+        self._sample_in = 0
+        self._sample_out = 0
+        self._sample_seconds = 0.0
+
+    def record(self, zinfo: zipfile.ZipInfo, file_path: os.PathLike, seconds: float) -> None:
+        """
+        Record a written member.
+
+        Args:
+            zinfo: Member as written
+            file_path: Source file, read again only for sampled members
+            seconds: Time spent writing the member
+        """
+        self.seconds += seconds
+
+        if zinfo.compress_type != zipfile.ZIP_STORED:
+            self.deflated_files += 1
+            self.deflated_bytes += zinfo.file_size
+            self.deflated_out += zinfo.compress_size
+            return
+
+        self.stored_files += 1
+        self.stored_bytes += zinfo.file_size
+
+        if self.stored_files % SAMPLE_EVERY != 1:
+            return
+
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read(SAMPLE_SIZE)
+        except OSError:
+            return
+
+        start = time.perf_counter()
+        compressed = zlib.compress(data, self.sample_level)
+        self._sample_seconds += time.perf_counter() - start
+        self._sample_in += len(data)
+        self._sample_out += min(len(compressed), len(data))
+
+    def estimate(self) -> Tuple[float, int]:
+        """
+        Estimate the effect of storing instead of deflating.
+
+        Returns:
+            (seconds saved, bytes lost)
+        """
+        if not self._sample_in:
+            return 0.0, 0
+
+        ratio = self._sample_out / self._sample_in
+        throughput = self._sample_in / max(self._sample_seconds, 1e-9)
+
+        return self.stored_bytes / throughput, int(self.stored_bytes * (1 - ratio))
+
+    def summary(self) -> str:
+        """Get a one-line human readable report."""
+        mb = 1024 * 1024
+        saved_seconds, lost_bytes = self.estimate()
+        ratio = self.deflated_out / self.deflated_bytes if self.deflated_bytes else 1.0
+
+        return (
+            f"deflated {self.deflated_files} files "
+            f"({self.deflated_bytes / mb:.1f} MB -> {self.deflated_out / mb:.1f} MB, "
+            f"{ratio:.0%}), stored {self.stored_files} files "
+            f"({self.stored_bytes / mb:.1f} MB): ~{saved_seconds:.2f}s saved, "
+            f"~{lost_bytes / mb:.2f} MB larger, {self.seconds:.1f}s total"
+        )
+
+
+class HashingWriter:
+    """
+    Write-only file wrapper that hashes bytes as they stream to disk.
+
+    Refuses to seek, so zipfile writes data descriptors instead of going
+    back to patch local headers, and every byte is hashed exactly once.
+    """
+
+    def __init__(self, fileobj: BinaryIO, algorithms: Iterable[str] = ("md5", "sha256")) -> None:
+        self._fileobj = fileobj
+        self._position = 0
+        self.hashes = {name: hashlib.new(name) for name in algorithms}
+
+    def write(self, data: bytes) -> int:
+        self._fileobj.write(data)
+        for digest in self.hashes.values():
+            digest.update(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, *args: int) -> int:
+        raise OSError("HashingWriter is not seekable")
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self) -> None:
+        self._fileobj.flush()
+
+    def hexdigest(self, algorithm: str) -> str:
+        """Get hex digest of everything written so far."""
+        return self.hashes[algorithm].hexdigest()
+
+
+def reproducible_date_time() -> Tuple[int, int, int, int, int, int]:
+    """
+    Get the fixed member timestamp for reproducible archives.
+
+    Honours SOURCE_DATE_EPOCH so CI can pin a meaningful date;
+    falls back to the zip epoch.
+
+    Returns:
+        Zip date_time tuple
+    """
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+
+    if epoch:
+        try:
+            date_time = time.gmtime(int(epoch))[:6]
+        except (ValueError, OverflowError):
+            return ZIP_EPOCH
+        # Zip timestamps cannot predate 1980
+        return max(date_time, ZIP_EPOCH)
+
+    return ZIP_EPOCH
+
+
+def make_zip_info(
+    file_path: os.PathLike,
+    arc_name: str,
+    date_time: Optional[Tuple[int, int, int, int, int, int]] = None
+) -> zipfile.ZipInfo:
+    """
+    Build member metadata for a file.
+
+    Args:
+        file_path: Source file on disk
+        arc_name: Member name (forward slashes)
+        date_time: Normalise timestamp and permissions to this date;
+            None keeps the file's own mtime and mode
+
+    Returns:
+        ZipInfo with file_size set
+    """
+    if date_time is None:
+        return zipfile.ZipInfo.from_file(file_path, arc_name)
+
+    zinfo = zipfile.ZipInfo(arc_name, date_time)
+    zinfo.create_system = ZIP_SYSTEM_UNIX
+    zinfo.external_attr = (0o100000 | REPRODUCIBLE_FILE_MODE) << 16
+    zinfo.file_size = os.stat(file_path).st_size
+    return zinfo
+
+
+def write_file(
+    zf: zipfile.ZipFile,
+    file_path: os.PathLike,
+    arc_name: str,
+    compress_type: int = zipfile.ZIP_DEFLATED,
+    compress_level: Optional[int] = None,
+    date_time: Optional[Tuple[int, int, int, int, int, int]] = None,
+    digest: Optional[hashlib._Hash] = None
+) -> zipfile.ZipInfo:
+    """
+    Stream a file into the archive.
+
+    Args:
+        zf: Archive open for writing
+        file_path: Source file on disk
+        arc_name: Member name (forward slashes)
+        compress_type: ZIP_DEFLATED or ZIP_STORED
+        compress_level: Deflate level, None for zlib's default
+        date_time: Write reproducibly with this timestamp (see make_zip_info)
+        digest: Optional hash object updated with the file contents
+
+    Returns:
+        ZipInfo of the written member
+    """
+    # file_size is known up front so zipfile can decide on zip64 before streaming
+    zinfo = make_zip_info(file_path, arc_name, date_time)
+    zinfo.compress_type = compress_type
+    # Read by ZipFile.open(zinfo, "w"); there is no public setter before 3.13
+    zinfo._compresslevel = compress_level
+
+    with open(file_path, "rb") as src, zf.open(zinfo, "w") as dest:
+        if digest is None:
+            shutil.copyfileobj(src, dest, COPY_BUFFER_SIZE)
+        else:
+            for chunk in iter(lambda: src.read(COPY_BUFFER_SIZE), b""):
+                digest.update(chunk)
+                dest.write(chunk)
+
+    return zinfo
+
+
+def job_count(value: str) -> int:
+    """
+    Parse a --jobs option for argparse: a worker count, or 0 for all CPUs.
+
+    Args:
+        value: Command-line value
+
+    Returns:
+        Number of worker processes
+
+    Raises:
+        argparse.ArgumentTypeError: Not an integer, or negative
+    """
+    try:
+        jobs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid job count: {value!r}")
+
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(f"job count must be 0 or more, not {jobs}")
+    return jobs or os.cpu_count() or 1
+
+
+def compress_file(file_path: str, compress_level: int) -> Tuple[int, int, bytes, str, float]:
+    """
+    Deflate a whole file in memory.
+
+    Module-level with plain arguments so it can run in a worker process.
+
+    Args:
+        file_path: Source file on disk
+        compress_level: Deflate level
+
+    Returns:
+        (CRC32, uncompressed size, raw deflate data, SHA-256 hex digest,
+        seconds taken)
+    """
+    start = time.perf_counter()
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+    digest = hashlib.sha256()
+    chunks = []
+    crc = 0
+    size = 0
+
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+            digest.update(chunk)
+            size += len(chunk)
+            chunks.append(compressor.compress(chunk))
+
+    chunks.append(compressor.flush())
+    return crc, size, b"".join(chunks), digest.hexdigest(), time.perf_counter() - start
+
+
+def file_crc32(file_path: os.PathLike) -> int:
+    """
+    Compute the zip-style CRC32 of a file without loading it whole.
+
+    Args:
+        file_path: File on disk
+
+    Returns:
+        CRC32 as stored in zip headers
+    """
+    crc = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def write_compressed(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, data: bytes) -> None:
+    """
+    Append a member whose data is already deflated.
+
+    zipfile has no public API for raw members, so this writes the local
+    header itself and registers the member for the central directory.
+    CRC and sizes are known, so no data descriptor is needed and the
+    archive may be seekable or not.
+
+    Args:
+        zf: Archive open for writing
+        zinfo: Member with CRC, file_size and compress_type set
+        data: Compressed member data
+    """
+    zinfo.compress_size = len(data)
+    zinfo.flag_bits = 0
+    zip64 = (
+        zinfo.file_size > zipfile.ZIP64_LIMIT
+        or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    )
+
+    with zf._lock:
+        if zf._writing:
+            raise ValueError("Can't write to ZIP archive while an open writing handle exists")
+
+        zf._writecheck(zinfo)
+        zf._didModify = True
+
+        if zf._seekable:
+            zf.fp.seek(zf.start_dir)
+
+        zinfo.header_offset = zf.fp.tell()
+        zf.fp.write(zinfo.FileHeader(zip64))
+        zf.fp.write(data)
+
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+        zf.start_dir = zf.fp.tell()
+
+
+def write_member(
+    zf: zipfile.ZipFile,
+    file_path: os.PathLike,
+    arc_name: str,
+    policy: CompressionPolicy,
+    stats: Optional[CompressionStats] = None,
+    date_time: Optional[Tuple[int, int, int, int, int, int]] = None,
+    digest: Optional[hashlib._Hash] = None
+) -> zipfile.ZipInfo:
+    """
+    Add a file using the compression chosen by a policy.
+
+    Args:
+        zf: Archive open for writing
+        file_path: Source file on disk
+        arc_name: Member name (forward slashes)
+        policy: Compression policy
+        stats: Optional stats collector
+        date_time: Write reproducibly with this timestamp; None keeps
+            the file's own mtime and mode
+        digest: Optional hash object updated with the file contents
+
+    Returns:
+        ZipInfo of the written member
+    """
+    compress_type, compress_level = policy.select(arc_name)
+    start = time.perf_counter()
+
+    zinfo = write_file(
+        zf, file_path, arc_name, compress_type, compress_level, date_time, digest
+    )
+
+    if stats is not None:
+        stats.record(zinfo, file_path, time.perf_counter() - start)
+
+    return zinfo
+
+
+def manifest_entry(arc_name: str, size: int, crc: int, sha256: str) -> Dict[str, object]:
+    """
+    Build the manifest record for one archive member.
+
+    Args:
+        arc_name: Member name
+        size: Uncompressed size
+        crc: CRC32 as stored in the zip
+        sha256: SHA-256 hex digest of the contents
+
+    Returns:
+        Dict with path, size, crc32, sha256 and addon keys
+    """
+    return {
+        "path": arc_name,
+        "size": size,
+        "crc32": crc,
+        "sha256": sha256,
+        "addon": owning_addon(arc_name),
+    }
+
+
+def owning_addon(arc_name: str) -> Optional[str]:
+    """
+    Get the addon a build or backup member belongs to.
+
+    Args:
+        arc_name: Member name, e.g. "userdata/addon_data/<id>/settings.xml"
+
+    Returns:
+        Addon ID, or None for files outside addons and addon_data
+    """
+    parts = arc_name.split("/")
+
+    if len(parts) > 2 and parts[0] in ("addons", "addon_data"):
+        return parts[1]
+    if len(parts) > 3 and parts[0] == "userdata" and parts[1] == "addon_data":
+        return parts[2]
+
+    return None
@@ -10,6 +10,30 @@ BUILD_VERSION = "1.0.0"
 # Build download URLs (GitHub Pages hosted)
 BUILD_URL = "https://jodisfields.github.io/kodi-build/builds/jodisbuild-latest.zip"
 CHECKSUM_URL = "https://jodisfields.github.io/kodi-build/builds/jodisbuild-latest.zip.md5"
+CHECKSUM_SHA256_URL = "https://jodisfields.github.io/kodi-build/builds/jodisbuild-latest.zip.sha256"
+
+# Small index with the current build version and checksums, used to
+# check for updates without downloading the build
+CHANNEL_URL = "https://jodisfields.github.io/kodi-build/builds/jodisbuild-channel.json"
+
+# Upper bound on concurrent connections for segmented build downloads
+# (1 disables segmenting)
+DOWNLOAD_CONNECTIONS = 6
+
+# Archive members replaced by Update Build; settings and user data are kept
+UPDATE_INCLUDE_PATTERNS = ["addons/*"]
+UPDATE_EXCLUDE_PATTERNS = ["addon_data/*", "userdata/*"]
+
+# Delete files installed by a previous build that an update no longer ships
+UPDATE_PRUNE_REMOVED = True
+
+# Fetch only changed add-on files from the published build with HTTP Range
+# requests, falling back to a full download if the server can't do that
+DELTA_UPDATES = True
+
+# Threads that inflate and write archive members in parallel
+# (0 = one per CPU core)
+EXTRACT_WORKERS = 0
 
 # Repository URL for reference
 REPO_URL = "https://jodisfields.github.io/kodi-build/"
@@ -82,28 +106,95 @@ BUILD_INCLUDE_DIRS = [
     "userdata/keymaps",
 ]
 
-# Patterns to exclude from build packages
-BUILD_EXCLUDE_PATTERNS = [
-    "*/Thumbnails/*",
-    "*/cache/*",
-    "*/temp/*",
-    "*/.git/*",
-    "*.log",
-    "*.pyc",
-    "*/__pycache__/*",
-    "*/Textures*.db",
-    "*/Addons*.db",
-    "*/crash*.txt",
-    "*/.DS_Store",
-    "*/Thumbs.db",
-]
-
 # Directories to include in backups
 BACKUP_DIRS = [
     "addon_data",
     "userdata",
 ]
 
+# Data Kodi and add-ons rebuild on their own, by category. Backups skip
+# it unless asked to include everything. Matched against paths relative
+# to special://home.
+BACKUP_REGENERABLE = {
+    "Thumbnails": ["userdata/Thumbnails/*"],
+    "Texture database": ["userdata/Database/Textures*.db"],
+    "Add-on database": ["userdata/Database/Addons*.db"],
+    "EPG database": ["userdata/Database/Epg*.db"],
+    "Scraper and add-on caches": [
+        "userdata/addon_data/*/cache.db",
+        "userdata/addon_data/*/*cache*.db",
+        "userdata/addon_data/*/cache/*",
+    ],
+    "Temporary files and logs": [
+        "*/temp/*",
+        "*/packages/*",
+        "*.log",
+        "*.pyc",
+        "*/__pycache__/*",
+        "*/crash*.txt",
+        "*/.DS_Store",
+        "*/Thumbs.db",
+    ],
+}
+
+# Backup throughput assumed for time estimates until one has been measured
+BACKUP_ESTIMATE_RATE = 10 * 1024 * 1024
+
+# Deflate level for backups; low-end devices favour speed over ratio.
+# Images and other compressed media are always stored as-is.
+BACKUP_COMPRESS_LEVEL = 1
+
+# Backup snapshots to keep; files only older snapshots used are deleted
+BACKUP_KEEP = 10
+
+# Size to trim the thumbnail cache to, keeping the most recently used
+THUMBNAIL_CACHE_TARGET_MB = 256
+
+# Update Addons<N>.db in place after installs; False deletes it so Kodi
+# rescans every add-on on the next start
+ADDON_DB_INCREMENTAL = True
+
+# Kodi databases to optimize, newest version of each
+OPTIMIZE_KODI_DATABASES = ["MyVideos", "Textures", "Addons", "Epg"]
+
+# Add-on databases to optimize, relative to userdata/addon_data
+OPTIMIZE_ADDON_DATABASES = [
+    "script.module.cocoscrapers/cache.db",
+    "script.module.cocoscrapers/undesirables.db",
+]
+
+# Streaming cache profiles written to guisettings.xml. The largest
+# profile whose RAM and storage minimums a device meets is suggested.
+CACHE_PROFILES = {
+    "Fire TV Stick": {
+        "min_ram_mb": 0, "min_storage_gb": 0,
+        "memorysize_mb": 60, "readfactor": 4.0, "buffermode": 1,
+    },
+    "Fire TV Stick 4K Max": {
+        "min_ram_mb": 1500, "min_storage_gb": 10,
+        "memorysize_mb": 150, "readfactor": 8.0, "buffermode": 1,
+    },
+    "PC": {
+        "min_ram_mb": 6000, "min_storage_gb": 64,
+        "memorysize_mb": 500, "readfactor": 20.0, "buffermode": 1,
+    },
+}
+
+# Kodi can use 3x memorysize of RAM; keep that within this share of RAM
+CACHE_RAM_SHARE = 0.25
+
+# readfactor is capped at the measured throughput over this bitrate (4K
+# remux), since Kodi cannot read ahead faster than the link delivers
+CACHE_REFERENCE_MBPS = 40
+CACHE_MIN_READFACTOR = 4.0
+
+# Endpoint downloaded for a few seconds to measure throughput. Only the
+# first THROUGHPUT_PROBE_BYTES are requested, so metered links are not
+# charged for the whole build.
+THROUGHPUT_PROBE_URL = BUILD_URL
+THROUGHPUT_PROBE_SECONDS = 5
+THROUGHPUT_PROBE_BYTES = 16 * 1024 * 1024
+
 # Cache directories for cleanup
 CACHE_DIRS = [
     "cache",
@@ -0,0 +1,287 @@
+"""
+Maintenance of Kodi's SQLite databases.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Kodi holds its own connections; wait this long for its locks
+BUSY_TIMEOUT = 10.0
+
+# Rows deleted per statement, well under SQLite's bound-parameter limit
+DELETE_BATCH = 500
+
+# Untracked thumbnails newer than this may belong to a row Kodi is adding
+ORPHAN_GRACE = 3600
+
+
+def latest_database(db_dir: Path, name: str) -> Optional[Path]:
+    """
+    Find the newest schema version of a Kodi database.
+
+    Args:
+        db_dir: userdata/Database directory
+        name: Database name without version, e.g. "Textures"
+
+    Returns:
+        Path of e.g. Textures13.db, or None if there is none
+    """
+    pattern = re.compile(rf"{re.escape(name)}(\d+)\.db$")
+    versions = []
+
+    if db_dir.is_dir():
+        for path in db_dir.iterdir():
+            match = pattern.match(path.name)
+            if match:
+                versions.append((int(match.group(1)), path))
+
+    return max(versions)[1] if versions else None
+
+
+@contextmanager
+def connect(db_path: Path) -> Iterator[sqlite3.Connection]:
+    """
+    Open a Kodi database, waiting for locks Kodi may hold.
+
+    Commits on success, rolls back on error and always closes.
+    """
+    conn = sqlite3.connect(str(db_path), timeout=BUSY_TIMEOUT)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def optimize(db_path: Path) -> Dict[str, object]:
+    """
+    Check, reindex, analyze and vacuum a database.
+
+    A database that fails its integrity check is left untouched, since
+    rewriting it could lose what is still readable.
+
+    Args:
+        db_path: SQLite database file
+
+    Returns:
+        Dict with integrity ("ok" or the first problem), size_before,
+        size_after, scan_before and scan_after (seconds to scan every
+        table) and seconds spent optimizing
+    """
+    result: Dict[str, object] = {"size_before": db_path.stat().st_size}
+
+    with connect(db_path) as conn:
+        start = time.perf_counter()
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        result["integrity"] = problems[0] if problems else "ok"
+        result["scan_before"] = _scan_time(conn)
+
+        if result["integrity"] != "ok":
+            logger.warning(f"{db_path.name} failed integrity check: {result['integrity']}")
+            result.update(size_after=result["size_before"], scan_after=result["scan_before"], seconds=0.0)
+            return result
+
+        conn.execute("REINDEX")
+        conn.execute("ANALYZE")
+        conn.commit()
+        # VACUUM rewrites the file and cannot run inside a transaction
+        conn.execute("VACUUM")
+
+        result["scan_after"] = _scan_time(conn)
+        result["seconds"] = time.perf_counter() - start
+
+    result["size_after"] = db_path.stat().st_size
+    logger.info(
+        f"Optimized {db_path.name}: {result['size_before']} -> {result['size_after']} bytes, "
+        f"scan {result['scan_before']:.3f}s -> {result['scan_after']:.3f}s"
+    )
+    return result
+
+
+def _scan_time(conn: sqlite3.Connection) -> float:
+    """Time a full count of every table, a rough measure of fragmentation."""
+    tables = [
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )
+    ]
+    start = time.perf_counter()
+    for table in tables:
+        quoted = table.replace('"', '""')
+        conn.execute(f'SELECT COUNT(*) FROM "{quoted}"').fetchone()
+    return time.perf_counter() - start
+
+
+def _batches(items: List[int]) -> Iterator[List[int]]:
+    for start in range(0, len(items), DELETE_BATCH):
+        yield items[start:start + DELETE_BATCH]
+
+
+class TextureCache:
+    """
+    Kodi's thumbnail cache: Textures<N>.db plus the files under
+    userdata/Thumbnails it points at.
+
+    Eviction removes the least recently used thumbnails until the cache
+    fits a budget, so the images the home screen keeps showing stay cached.
+    """
+
+    def __init__(self, db_path: Path, thumbnails_dir: Path) -> None:
+        self.db_path = db_path
+        self.thumbnails_dir = thumbnails_dir
+
+    def size(self) -> int:
+        """Get the bytes used by cached thumbnail files."""
+        total = 0
+        for root, _, files in os.walk(self.thumbnails_dir):
+            for name in files:
+                try:
+                    total += os.stat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def evict(self, target_bytes: int) -> Tuple[int, int]:
+        """
+        Delete least recently used thumbnails until the cache fits.
+
+        Files no texture row points at go first, then textures never used,
+        then the rest by last use. Rows are deleted and committed before
+        their files, so Kodi never looks up a thumbnail that is gone.
+
+        Args:
+            target_bytes: Size the thumbnail files should fit in
+
+        Returns:
+            (files deleted, bytes freed)
+        """
+        used = self.size()
+        if used <= target_bytes:
+            return 0, 0
+
+        orphan_before = time.time() - ORPHAN_GRACE
+
+        with connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT texture.id, texture.cachedurl, MAX(sizes.lastusetime) AS lastuse "
+                "FROM texture LEFT JOIN sizes ON sizes.idtexture = texture.id "
+                "GROUP BY texture.id ORDER BY lastuse ASC"
+            ).fetchall()
+
+        deleted = freed = 0
+
+        # Orphans: files in Thumbnails with no texture row
+        known = {os.path.normcase(str(self.thumbnails_dir / url)) for _, url, _ in rows if url}
+        for root, _, files in os.walk(self.thumbnails_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.normcase(path) in known:
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > orphan_before:
+                        continue
+                    os.unlink(path)
+                except OSError:
+                    continue
+                deleted += 1
+                freed += stat.st_size
+
+        # Oldest first (never-used rows sort first as NULL)
+        evicted: List[Tuple[int, Path, int]] = []
+        remaining = used - freed
+        for texture_id, url, _ in rows:
+            if remaining <= target_bytes:
+                break
+            path = self.thumbnails_dir / url if url else None
+            try:
+                size = path.stat().st_size if path else 0
+            except OSError:
+                size = 0
+            evicted.append((texture_id, path, size))
+            remaining -= size
+
+        ids = [texture_id for texture_id, _, _ in evicted]
+        with connect(self.db_path) as conn:
+            for batch in _batches(ids):
+                marks = ",".join("?" * len(batch))
+                conn.execute(f"DELETE FROM sizes WHERE idtexture IN ({marks})", batch)
+                conn.execute(f"DELETE FROM texture WHERE id IN ({marks})", batch)
+
+        for _, path, size in evicted:
+            if path is None:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            deleted += 1
+            freed += size
+
+        logger.info(
+            f"Evicted {len(ids)} textures: {deleted} files, "
+            f"{freed / (1024 * 1024):.1f} MB freed"
+        )
+        return deleted, freed
+
+
+class AddonDatabase:
+    """
+    The installed table of Kodi's Addons<N>.db.
+
+    Updating it in place keeps enabled states, repository data and
+    update history, which deleting the database throws away.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+
+    def sync(self, changed: Iterable[str], removed: Iterable[str]) -> Tuple[int, int, int]:
+        """
+        Record installed, updated and removed add-ons.
+
+        Add-ons new to the table are enabled, since the build ships them
+        to be used; known ones keep whatever state the user chose.
+
+        Args:
+            changed: IDs of add-ons that are new or changed version
+            removed: IDs of add-ons no longer on disk
+
+        Returns:
+            (rows added, rows updated, rows removed)
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        added = updated = 0
+
+        with connect(self.db_path) as conn:
+            existing = {row[0] for row in conn.execute("SELECT addonID FROM installed")}
+
+            for addon_id in changed:
+                if addon_id in existing:
+                    conn.execute("UPDATE installed SET lastUpdated = ? WHERE addonID = ?", (now, addon_id))
+                    updated += 1
+                else:
+                    conn.execute(
+                        "INSERT INTO installed (addonID, enabled, installDate, lastUpdated) VALUES (?, 1, ?, ?)",
+                        (addon_id, now, now)
+                    )
+                    added += 1
+
+            gone = [addon_id for addon_id in removed if addon_id in existing]
+            for start in range(0, len(gone), DELETE_BATCH):
+                batch = gone[start:start + DELETE_BATCH]
+                conn.execute(f"DELETE FROM installed WHERE addonID IN ({','.join('?' * len(batch))})", batch)
+
+        logger.info(f"Updated {self.db_path.name}: {added} added, {updated} updated, {len(gone)} removed")
+        return added, updated, len(gone)
@@ -0,0 +1,808 @@
+"""
+Resumable and segmented HTTP downloads for build archives.
+Standard library only (no xbmc imports) so it can run against a local
+http.server stand-in outside Kodi.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Deque, Dict, Optional, Set, Tuple
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[float, str], None]
+
+CHUNK_SIZE = 256 * 1024  # 256KB reads keep memory flat and progress smooth
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 5
+RETRY_BACKOFF = 2.0  # seconds, doubled per consecutive failure
+
+# Progress reporting cadence and throughput averaging window
+PROGRESS_INTERVAL = 0.25
+THROUGHPUT_WINDOW = 3.0
+
+# Segmented downloads: fixed-size ranges fetched over a growing number of
+# connections. A connection is added every ADAPT_INTERVAL while the last
+# one raised throughput by at least ADAPT_GAIN.
+SEGMENT_SIZE = 4 * 1024 * 1024
+MIN_SEGMENTED_SIZE = 2 * SEGMENT_SIZE
+INITIAL_CONNECTIONS = 2
+MAX_CONNECTIONS = 6
+ADAPT_INTERVAL = 4.0
+ADAPT_GAIN = 1.1
+
+# Segment data arriving ahead of the hashed frontier is held in memory up
+# to this much; past it, those segments are hashed from disk instead
+HASH_BUFFER_SIZE = 4 * SEGMENT_SIZE
+
+# Throughput probes skip the first chunk, which mostly measures setup
+PROBE_DURATION = 5.0
+PROBE_MAX_BYTES = 16 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    """Download failed and cannot be resumed automatically."""
+
+
+class DownloadCancelled(DownloadError):
+    """Download was cancelled; the .part file is kept for resuming."""
+
+
+class _RemoteChanged(Exception):
+    """The remote file no longer matches the validators of the .part file."""
+
+
+class ThroughputMeter:
+    """Measures recent transfer rate over a sliding time window."""
+
+    def __init__(self, window: float = THROUGHPUT_WINDOW) -> None:
+        self.window = window
+        self._samples: Deque[Tuple[float, int]] = deque()
+        self._total = 0
+
+    def add(self, num_bytes: int) -> None:
+        now = time.monotonic()
+        self._total += num_bytes
+        self._samples.append((now, self._total))
+
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def rate(self) -> float:
+        """Get bytes per second over the window."""
+        if len(self._samples) < 2:
+            return 0.0
+
+        (start, start_total), (end, end_total) = self._samples[0], self._samples[-1]
+        elapsed = end - start
+        return (end_total - start_total) / elapsed if elapsed > 0 else 0.0
+
+
+def measure_throughput(
+    url: str,
+    duration: float = PROBE_DURATION,
+    timeout: float = DEFAULT_TIMEOUT,
+    chunk_size: int = CHUNK_SIZE,
+    max_bytes: int = PROBE_MAX_BYTES
+) -> float:
+    """
+    Measure download throughput by reading a URL for a few seconds.
+
+    The data is discarded. Timing starts after the first chunk, so
+    connection setup and TCP slow start weigh less. Only the first
+    max_bytes are requested, so a fast link stops early instead of
+    pulling down a large file.
+
+    Args:
+        url: Endpoint to read, ideally larger than duration's worth of data
+        duration: Seconds to read for
+        timeout: Socket timeout in seconds
+        chunk_size: Read size in bytes
+        max_bytes: Most bytes to read
+
+    Returns:
+        Bytes per second
+
+    Raises:
+        DownloadError: Request failed or the response was too short to time
+    """
+    try:
+        request = Request(url)
+        request.add_header("Range", f"bytes=0-{max_bytes - 1}")
+
+        with urlopen(request, timeout=timeout) as response:
+            first = response.read(chunk_size)
+            if not first:
+                raise DownloadError("Throughput probe returned no data")
+
+            # A server ignoring Range sends everything; stop at max_bytes anyway
+            received = 0
+            remaining = max_bytes - len(first)
+            start = time.monotonic()
+            elapsed = 0.0
+            while elapsed < duration and remaining > 0:
+                chunk = response.read(min(chunk_size, remaining))
+                elapsed = time.monotonic() - start
+                if not chunk:
+                    break
+                received += len(chunk)
+                remaining -= len(chunk)
+    except (OSError, http.client.HTTPException) as e:
+        raise DownloadError(f"Throughput probe failed: {e}") from e
+
+    if not received or elapsed <= 0:
+        raise DownloadError("Throughput probe response too short to measure")
+
+    logger.info(f"Measured {received * 8 / elapsed / 1e6:.1f} Mbit/s from {url}")
+    return received / elapsed
+
+
+class ResumableDownload:
+    """
+    Downloads a URL to a .part file and resumes with HTTP Range requests.
+
+    Validators (ETag/Last-Modified) are stored beside the .part file and
+    sent as If-Range, so a changed remote file restarts from zero instead
+    of producing a corrupt mix of old and new bytes.
+
+    With an algorithm set, the file is hashed as it arrives; a resumed
+    .part is hashed once from disk up to where the transfer continues.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        destination: Path,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        chunk_size: int = CHUNK_SIZE,
+        algorithm: Optional[str] = None
+    ) -> None:
+        self.url = url
+        self.destination = destination
+        self.part_path = destination.with_name(destination.name + ".part")
+        self.meta_path = destination.with_name(destination.name + ".part.json")
+        self.timeout = timeout
+        self.retries = retries
+        self.chunk_size = chunk_size
+        self.algorithm = algorithm
+
+        self.total_size = 0
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+
+        self._digest = hashlib.new(algorithm) if algorithm else None
+        self._hashed = 0
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """HTTP validators of the downloaded file."""
+        validators = {}
+        if self.etag:
+            validators["etag"] = self.etag
+        if self.last_modified:
+            validators["last_modified"] = self.last_modified
+        return validators
+
+    @property
+    def hexdigest(self) -> Optional[str]:
+        """Digest of the completed file, if an algorithm was given."""
+        return self._digest.hexdigest() if self._digest else None
+
+    def run(
+        self,
+        progress_callback: Optional[ProgressCallback] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None
+    ) -> Path:
+        """
+        Download, resuming any previous .part file.
+
+        Args:
+            progress_callback: Function(progress: 0-1, message: str)
+            is_cancelled: Polled between chunks; True stops the download
+
+        Returns:
+            Path to the completed file
+
+        Raises:
+            DownloadCancelled: is_cancelled returned True
+            DownloadError: Retries exhausted or unrecoverable HTTP error
+        """
+        self.destination.parent.mkdir(parents=True, exist_ok=True)
+        self._load_meta()
+
+        meter = ThroughputMeter()
+        failures = 0
+
+        while True:
+            try:
+                if self._fetch(meter, progress_callback, is_cancelled):
+                    break
+                failures = 0
+            except DownloadError:
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                failures += 1
+                if failures > self.retries:
+                    raise DownloadError(f"Download failed after {self.retries} retries: {e}") from e
+
+                delay = RETRY_BACKOFF * (2 ** (failures - 1))
+                logger.warning(f"Download interrupted ({e}); resuming in {delay:.0f}s")
+                time.sleep(delay)
+
+        self._hash_part(self.part_path.stat().st_size)
+        os.replace(self.part_path, self.destination)
+        self._clear_meta()
+        logger.info(f"Downloaded {self.url} to {self.destination}")
+        return self.destination
+
+    def _fetch(
+        self,
+        meter: ThroughputMeter,
+        progress_callback: Optional[ProgressCallback],
+        is_cancelled: Optional[Callable[[], bool]]
+    ) -> bool:
+        """
+        Make one request and stream as much as the server sends.
+
+        Returns:
+            True when the file is complete, False if it must restart from zero
+        """
+        offset = self.part_path.stat().st_size if self.part_path.exists() else 0
+
+        if self.total_size and offset == self.total_size:
+            return True
+
+        request = Request(self.url)
+        validator = self._range_validator(self.etag, self.last_modified)
+        if offset and validator:
+            request.add_header("Range", f"bytes={offset}-")
+            request.add_header("If-Range", validator)
+        else:
+            offset = 0
+
+        try:
+            response = urlopen(request, timeout=self.timeout)
+        except HTTPError as e:
+            if e.code == 416 and offset:
+                # Nothing left to send for our range; start over to be safe
+                logger.warning("Range not satisfiable; restarting download")
+                self._reset()
+                return False
+            if 400 <= e.code < 500:
+                raise DownloadError(f"HTTP error {e.code} {e.reason}") from e
+            raise
+
+        with response:
+            if response.status == 206 and offset:
+                if self._content_range_start(response) != offset:
+                    raise DownloadError("Server returned an unexpected byte range")
+                mode = "ab"
+                logger.info(f"Resuming download at {offset / (1024 * 1024):.1f} MB")
+            else:
+                # Full body: first request, validator changed or no Range support
+                offset = 0
+                mode = "wb"
+                self._restart_digest()
+
+            self._remember_response(response, offset)
+            self._hash_part(offset)
+
+            downloaded = offset
+            last_report = 0.0
+
+            with open(self.part_path, mode) as out:
+                while True:
+                    if is_cancelled and is_cancelled():
+                        raise DownloadCancelled("Download cancelled")
+
+                    chunk = response.read(self.chunk_size)
+                    if not chunk:
+                        break
+
+                    out.write(chunk)
+                    downloaded += len(chunk)
+                    meter.add(len(chunk))
+
+                    if self._digest:
+                        self._digest.update(chunk)
+                        self._hashed += len(chunk)
+
+                    now = time.monotonic()
+                    if progress_callback and now - last_report >= PROGRESS_INTERVAL:
+                        last_report = now
+                        self._report(progress_callback, downloaded, meter.rate())
+
+        if self.total_size and downloaded < self.total_size:
+            raise http.client.IncompleteRead(b"", self.total_size - downloaded)
+
+        if progress_callback:
+            self._report(progress_callback, downloaded, meter.rate())
+
+        return True
+
+    def _report(self, progress_callback: ProgressCallback, downloaded: int, rate: float) -> None:
+        mb = 1024 * 1024
+        message = f"Downloading: {downloaded / mb:.1f}"
+        if self.total_size:
+            message += f" / {self.total_size / mb:.1f}"
+        message += f" MB ({rate / mb:.1f} MB/s)"
+
+        progress = min(downloaded / self.total_size, 1.0) if self.total_size else 0.0
+        progress_callback(progress, message)
+
+    @staticmethod
+    def _content_range_start(response) -> Optional[int]:
+        """Parse the first byte offset from a Content-Range header."""
+        content_range = response.headers.get("Content-Range", "")
+        try:
+            return int(content_range.split()[1].split("-")[0])
+        except (IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def _range_validator(etag: Optional[str], last_modified: Optional[str]) -> Optional[str]:
+        """
+        Pick the validator to send as If-Range.
+
+        If-Range needs a strong validator (RFC 9110, 13.1.5): a weak ETag
+        never matches, so Last-Modified is used instead.
+        """
+        if etag and not etag.startswith("W/"):
+            return etag
+        return last_modified
+
+    def _remember_response(self, response, offset: int) -> None:
+        """Record size and validators from a response and persist them."""
+        length = int(response.headers.get("Content-Length") or 0)
+        self.total_size = offset + length if length else 0
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self._save_meta()
+
+    def _restart_digest(self) -> None:
+        if self._digest:
+            self._digest = hashlib.new(self.algorithm)
+            self._hashed = 0
+
+    def _hash_part(self, end: int) -> None:
+        """Feed .part bytes from the hashed position up to end into the digest."""
+        if not self._digest or self._hashed >= end:
+            return
+
+        with open(self.part_path, "rb") as f:
+            f.seek(self._hashed)
+            while self._hashed < end:
+                chunk = f.read(min(self.chunk_size, end - self._hashed))
+                if not chunk:
+                    break
+                self._digest.update(chunk)
+                self._hashed += len(chunk)
+
+    def _reset(self) -> None:
+        for path in (self.part_path, self.meta_path):
+            if path.exists():
+                path.unlink()
+        self.total_size = 0
+        self.etag = None
+        self.last_modified = None
+        self._restart_digest()
+
+    def _load_meta(self) -> Dict[str, object]:
+        """
+        Restore validators for an existing .part file of the same URL.
+
+        Returns:
+            The stored metadata, or an empty dict if the .part was discarded
+        """
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = {}
+
+        if meta.get("url") != self.url or not self.part_path.exists():
+            self._reset()
+            return {}
+
+        self.total_size = int(meta.get("total_size") or 0)
+        self.etag = meta.get("etag")
+        self.last_modified = meta.get("last_modified")
+        return meta
+
+    def _meta(self) -> Dict[str, object]:
+        return {
+            "url": self.url,
+            "total_size": self.total_size,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+        }
+
+    def _save_meta(self) -> None:
+        self.meta_path.write_text(json.dumps(self._meta()), encoding="utf-8")
+
+    def _clear_meta(self) -> None:
+        if self.meta_path.exists():
+            self.meta_path.unlink()
+
+
+class SegmentedDownload(ResumableDownload):
+    """
+    Downloads fixed-size byte ranges over several concurrent connections.
+
+    The .part file is preallocated to the full size and every segment is
+    written at its own offset, so segments may finish in any order. A
+    failed segment is retried on its own from the last byte it received.
+    Completed segments are listed in the .part.json sidecar, so an
+    interrupted download only fetches the ranges still missing.
+
+    Starts with INITIAL_CONNECTIONS and adds one at a time while doing so
+    still raises throughput, up to max_connections. Servers without Range
+    support or a strong validator, and small files, use the single-stream
+    path, as does a download whose ranges keep failing If-Range.
+
+    Hashing follows the in-order frontier. Chunks at the frontier are hashed
+    as they arrive and chunks ahead of it are held in memory until it gets
+    there, up to HASH_BUFFER_SIZE. Only segments restored on resume, or
+    dropped from that buffer, are read back from disk.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        destination: Path,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        chunk_size: int = CHUNK_SIZE,
+        algorithm: Optional[str] = None,
+        max_connections: int = MAX_CONNECTIONS,
+        segment_size: int = SEGMENT_SIZE
+    ) -> None:
+        super().__init__(url, destination, timeout, retries, chunk_size, algorithm)
+        self.max_connections = max(1, max_connections)
+        self.segment_size = segment_size
+        self.completed: Set[int] = set()
+
+        self._received: Dict[int, int] = {}
+        self._held: Dict[int, Tuple[int, bytearray]] = {}
+        self._held_bytes = 0
+        self._spilled: Set[int] = set()
+        self._segmented = False
+        self._downloaded = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def segment_count(self) -> int:
+        return -(-self.total_size // self.segment_size)
+
+    def run(
+        self,
+        progress_callback: Optional[ProgressCallback] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None
+    ) -> Path:
+        """
+        Download in parallel segments, resuming any previous .part file.
+
+        Args:
+            progress_callback: Function(progress: 0-1, message: str)
+            is_cancelled: Polled while downloading; True stops the download
+
+        Returns:
+            Path to the completed file
+
+        Raises:
+            DownloadCancelled: is_cancelled returned True
+            DownloadError: A segment exhausted its retries or HTTP error
+        """
+        self.destination.parent.mkdir(parents=True, exist_ok=True)
+        meta = self._load_meta()
+
+        for attempt in range(2):
+            if self.max_connections < 2 or not self._probe(meta):
+                return super().run(progress_callback, is_cancelled)
+
+            try:
+                self._download_segments(progress_callback, is_cancelled)
+                break
+            except _RemoteChanged:
+                self._reset()
+                meta = {}
+                if attempt:
+                    # The server keeps rejecting our ranges; stream it whole
+                    logger.warning("Byte ranges rejected again; downloading over a single connection")
+                    self._segmented = False
+                    return super().run(progress_callback, is_cancelled)
+                logger.warning("Remote file changed during download; restarting")
+
+        self._hash_part(self.total_size)
+        os.replace(self.part_path, self.destination)
+        self._clear_meta()
+        logger.info(f"Downloaded {self.url} to {self.destination} in {self.segment_count} segments")
+        return self.destination
+
+    def _probe(self, meta: Dict[str, object]) -> bool:
+        """
+        Check Range support with a HEAD request and prepare the .part file.
+
+        Args:
+            meta: Sidecar metadata of an existing .part file, if any
+
+        Returns:
+            True if the file can be fetched in segments
+        """
+        self._segmented = False
+        try:
+            with urlopen(Request(self.url, method="HEAD"), timeout=self.timeout) as response:
+                headers = response.headers
+        except (OSError, http.client.HTTPException) as e:
+            logger.debug(f"HEAD request failed ({e}); using a single connection")
+            headers = {}
+
+        size = int(headers.get("Content-Length") or 0)
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+
+        if (
+            headers.get("Accept-Ranges", "").lower() != "bytes"
+            or size < MIN_SEGMENTED_SIZE
+            or not self._range_validator(etag, last_modified)
+        ):
+            if meta.get("segment_size"):
+                # A preallocated .part is not a valid single-stream prefix
+                self._reset()
+            return False
+
+        if meta and (size, etag, last_modified) != (self.total_size, self.etag, self.last_modified):
+            logger.info("Remote file changed since the partial download; restarting")
+            self._reset()
+            meta = {}
+
+        self.total_size = size
+        self.etag = etag
+        self.last_modified = last_modified
+
+        if meta.get("segment_size") == self.segment_size:
+            self.completed = {int(index) for index in meta.get("completed", [])}
+        elif meta and not meta.get("segment_size"):
+            # Single-stream .part: every whole segment it covers is done
+            self.completed = set(range(self.part_path.stat().st_size // self.segment_size))
+        else:
+            self.completed = set()
+
+        with open(self.part_path, "r+b" if self.part_path.exists() else "wb") as f:
+            f.truncate(self.total_size)
+
+        self._segmented = True
+        self._save_meta()
+        return True
+
+    def _download_segments(
+        self,
+        progress_callback: Optional[ProgressCallback],
+        is_cancelled: Optional[Callable[[], bool]]
+    ) -> None:
+        pending = deque(i for i in range(self.segment_count) if i not in self.completed)
+        failures: Dict[int, int] = {}
+        active: Dict[Future, Tuple[int, int]] = {}
+        meter = ThroughputMeter()
+
+        self._received = {}
+        self._downloaded = sum(self._segment_length(i) for i in self.completed)
+        self._stop.clear()
+
+        if self.completed:
+            logger.info(f"Resuming download with {len(self.completed)}/{self.segment_count} segments done")
+
+        connections = min(INITIAL_CONNECTIONS, self.max_connections)
+        best_rate = 0.0
+        last_adapt = time.monotonic()
+        last_report = 0.0
+
+        with ThreadPoolExecutor(max_workers=self.max_connections) as pool:
+            try:
+                while pending or active:
+                    while pending and len(active) < connections:
+                        index = pending.popleft()
+                        delay = RETRY_BACKOFF * (2 ** (failures[index] - 1)) if index in failures else 0.0
+                        future = pool.submit(self._fetch_segment, index, meter, delay)
+                        active[future] = (index, self._received.get(index, 0))
+
+                    finished, _ = wait(active, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+
+                    for future in finished:
+                        index, received = active.pop(future)
+                        try:
+                            future.result()
+                        except (OSError, http.client.HTTPException) as e:
+                            if self._received.get(index, 0) > received:
+                                failures[index] = 1
+                            else:
+                                failures[index] = failures.get(index, 0) + 1
+                            if failures[index] > self.retries:
+                                raise DownloadError(
+                                    f"Segment {index} failed after {self.retries} retries: {e}"
+                                ) from e
+                            logger.warning(f"Segment {index} interrupted ({e}); retrying")
+                            pending.appendleft(index)
+                            # Errors under load usually mean the server is throttling us
+                            connections = max(1, connections - 1)
+                            continue
+
+                        self._complete(index)
+
+                    if is_cancelled and is_cancelled():
+                        raise DownloadCancelled("Download cancelled")
+
+                    with self._lock:
+                        rate = meter.rate()
+                        downloaded = self._downloaded
+
+                    now = time.monotonic()
+                    if now - last_adapt >= ADAPT_INTERVAL:
+                        last_adapt = now
+                        if (
+                            connections < self.max_connections
+                            and len(active) >= connections
+                            and rate > best_rate * ADAPT_GAIN
+                        ):
+                            best_rate = rate
+                            connections += 1
+                            logger.debug(f"Throughput {rate / 1024:.0f} KB/s; using {connections} connections")
+
+                    if progress_callback and now - last_report >= PROGRESS_INTERVAL:
+                        last_report = now
+                        self._report(progress_callback, downloaded, rate)
+            finally:
+                # Unblock workers so the pool can shut down on error or cancel
+                self._stop.set()
+
+        if progress_callback:
+            self._report(progress_callback, self._downloaded, meter.rate())
+
+    def _fetch_segment(self, index: int, meter: ThroughputMeter, delay: float = 0.0) -> None:
+        """
+        Fetch the rest of one segment into its place in the .part file.
+
+        Runs on a worker thread. Bytes written before a failure are kept in
+        _received, so a retry only requests what is still missing.
+        """
+        if delay and self._stop.wait(delay):
+            raise DownloadCancelled("Download stopped")
+
+        segment_start = index * self.segment_size
+        length = self._segment_length(index)
+        received = self._received.get(index, 0)
+        start = segment_start + received
+
+        request = Request(self.url)
+        request.add_header("Range", f"bytes={start}-{segment_start + length - 1}")
+        request.add_header("If-Range", self._range_validator(self.etag, self.last_modified))
+
+        try:
+            response = urlopen(request, timeout=self.timeout)
+        except HTTPError as e:
+            if e.code == 416:
+                raise _RemoteChanged() from e
+            if 400 <= e.code < 500 and e.code != 429:
+                raise DownloadError(f"HTTP error {e.code} {e.reason}") from e
+            raise
+
+        with response:
+            if response.status != 206:
+                # If-Range failed: the server sent the whole, newer file
+                raise _RemoteChanged()
+            if self._content_range_start(response) != start:
+                raise DownloadError("Server returned an unexpected byte range")
+
+            with open(self.part_path, "r+b") as out:
+                out.seek(start)
+                while received < length:
+                    if self._stop.is_set():
+                        raise DownloadCancelled("Download stopped")
+
+                    chunk = response.read(min(self.chunk_size, length - received))
+                    if not chunk:
+                        break
+
+                    out.write(chunk)
+                    with self._lock:
+                        self._hash_chunk(index, segment_start + received, chunk)
+                        received += len(chunk)
+                        self._received[index] = received
+                        self._downloaded += len(chunk)
+                        meter.add(len(chunk))
+
+        if received < length:
+            raise http.client.IncompleteRead(b"", length - received)
+
+    def _complete(self, index: int) -> None:
+        """Mark a segment done and hash whatever the frontier can now reach."""
+        with self._lock:
+            self.completed.add(index)
+            self._advance_hash()
+        self._save_meta()
+
+    def _hash_chunk(self, index: int, position: int, chunk: bytes) -> None:
+        """
+        Hash a chunk at the frontier, or hold it until the frontier gets
+        there. Called with _lock held.
+        """
+        if not self._digest:
+            return
+
+        if position == self._hashed:
+            self._digest.update(chunk)
+            self._hashed += len(chunk)
+            self._advance_hash()
+            return
+
+        if index in self._spilled:
+            return
+
+        start, held = self._held.get(index, (position, bytearray()))
+        if start + len(held) != position or self._held_bytes + len(chunk) > HASH_BUFFER_SIZE:
+            # Gap or over budget: hash this segment from disk once complete
+            self._drop_held(index)
+            self._spilled.add(index)
+            return
+
+        held += chunk
+        self._held[index] = (start, held)
+        self._held_bytes += len(chunk)
+
+    def _advance_hash(self) -> None:
+        """
+        Feed held chunks, then completed segments with nothing held, to the
+        digest in file order. Called with _lock held.
+        """
+        if not self._digest:
+            return
+
+        while self._hashed < self.total_size:
+            index = self._hashed // self.segment_size
+            start, held = self._held.get(index, (0, bytearray()))
+
+            if start <= self._hashed < start + len(held):
+                self._digest.update(memoryview(held)[self._hashed - start:])
+                self._hashed = start + len(held)
+            elif index in self.completed:
+                # Restored on resume or spilled from memory: read it back
+                self._hash_part(min((index + 1) * self.segment_size, self.total_size))
+            else:
+                break
+
+            self._drop_held(index)
+
+    def _drop_held(self, index: int) -> None:
+        _, held = self._held.pop(index, (0, b""))
+        self._held_bytes -= len(held)
+
+    def _segment_length(self, index: int) -> int:
+        start = index * self.segment_size
+        return min(self.segment_size, self.total_size - start)
+
+    def _reset(self) -> None:
+        super()._reset()
+        self.completed = set()
+        self._held = {}
+        self._held_bytes = 0
+        self._spilled = set()
+
+    def _meta(self) -> Dict[str, object]:
+        meta = super()._meta()
+        if self._segmented:
+            meta["segment_size"] = self.segment_size
+            meta["completed"] = sorted(self.completed)
+        return meta
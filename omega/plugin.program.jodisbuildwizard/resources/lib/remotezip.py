@@ -0,0 +1,331 @@
+"""
+Read members of a remote zip archive with HTTP Range requests.
+Standard library only (no xbmc imports) so it can run against a local
+http.server stand-in outside Kodi.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import struct
+import zipfile
+import zlib
+from bisect import bisect_right
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+CHUNK_SIZE = 256 * 1024
+
+# The end of central directory record is 22 bytes plus a comment of up to
+# 64KB; fetching this much from the end also catches small directories.
+TAIL_SIZE = 128 * 1024
+
+# Changed members closer together than this are fetched in one request
+MERGE_GAP = 64 * 1024
+
+END_OF_CENTRAL_DIR = b"PK\x05\x06"
+ZIP64_LOCATOR = b"PK\x06\x07"
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+FLAG_ENCRYPTED = 0x1
+
+
+class RemoteZipError(Exception):
+    """Remote archive cannot be read by range; fall back to a full download."""
+
+
+class _SparseFile(io.RawIOBase):
+    """
+    Read-only file of a given size where only the tail is known.
+
+    Lets zipfile parse a central directory fetched on its own; bytes
+    before the known tail read as zeros and are never used for that.
+    """
+
+    def __init__(self, size: int, offset: int, data: bytes) -> None:
+        self._size = size
+        self._offset = offset
+        self._data = data
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            pos += self._pos
+        elif whence == os.SEEK_END:
+            pos += self._size
+        self._pos = max(0, min(pos, self._size))
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = self._size if size is None or size < 0 else min(self._pos + size, self._size)
+        if end <= self._pos:
+            return b""
+
+        start = self._pos
+        self._pos = end
+
+        padding = b"\0" * max(0, min(end, self._offset) - start)
+        begin = max(start, self._offset) - self._offset
+        return padding + self._data[begin:max(end - self._offset, 0)]
+
+
+class RemoteZip:
+    """
+    Lists and extracts members of a zip archive served over HTTP.
+
+    The central directory is fetched from the end of the file, then each
+    requested member is streamed from its byte range and inflated straight
+    to disk. Every request after the first carries If-Range, so an archive
+    replaced mid-update fails instead of mixing two builds.
+    """
+
+    def __init__(self, url: str, timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.url = url
+        self.timeout = timeout
+
+        self.size = 0
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.fetched = 0
+
+        self._cd_offset = 0
+        self._offsets: List[int] = []
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """HTTP validators of the remote archive."""
+        validators = {}
+        if self.etag:
+            validators["etag"] = self.etag
+        if self.last_modified:
+            validators["last_modified"] = self.last_modified
+        return validators
+
+    def open(self) -> List[zipfile.ZipInfo]:
+        """
+        Fetch and parse the central directory.
+
+        Returns:
+            ZipInfo for every member, with header offsets into the remote file
+
+        Raises:
+            RemoteZipError: No Range support or the archive is malformed
+        """
+        with self._request(f"bytes=-{TAIL_SIZE}") as response:
+            self.size = self._total_size(response)
+            self.etag = response.headers.get("ETag")
+            self.last_modified = response.headers.get("Last-Modified")
+            tail = self._read_all(response)
+
+        tail_offset = self.size - len(tail)
+        cd_offset = self._central_directory_offset(tail, tail_offset)
+
+        if cd_offset < tail_offset:
+            with self._request(f"bytes={cd_offset}-{tail_offset - 1}") as response:
+                tail = self._read_all(response) + tail
+            tail_offset = cd_offset
+
+        try:
+            with zipfile.ZipFile(_SparseFile(self.size, tail_offset, tail)) as zf:
+                infos = zf.infolist()
+        except zipfile.BadZipFile as e:
+            raise RemoteZipError(f"Could not read remote central directory: {e}") from e
+
+        self._cd_offset = cd_offset
+        self._offsets = sorted(info.header_offset for info in infos)
+        logger.info(f"Read remote central directory: {len(infos)} members, {self.fetched} bytes fetched")
+        return infos
+
+    def extract(
+        self,
+        infos: List[zipfile.ZipInfo],
+        destination: Path,
+        on_bytes: Optional[Callable[[int], None]] = None
+    ) -> Iterator[zipfile.ZipInfo]:
+        """
+        Fetch and extract members, coalescing nearby ones into one request.
+
+        Each file is written beside its target and moved into place once its
+        CRC32 matches, so an interrupted update never leaves a torn file.
+
+        Args:
+            infos: Members from open() to extract
+            destination: Extraction destination directory
+            on_bytes: Called with the number of compressed bytes consumed
+
+        Yields:
+            Each member once it is in place
+        """
+        for start, end, group in self._ranges(infos):
+            with self._request(f"bytes={start}-{end - 1}") as response:
+                stream = _RangeStream(response, start, self)
+                for info in group:
+                    stream.skip_to(info.header_offset)
+                    self._extract_member(stream, info, destination / info.filename, on_bytes)
+                    yield info
+
+    def _ranges(self, infos: List[zipfile.ZipInfo]) -> Iterator[Tuple[int, int, List[zipfile.ZipInfo]]]:
+        """Group members into (start, end, members) byte ranges."""
+        group: List[zipfile.ZipInfo] = []
+        start = end = 0
+
+        for info in sorted(infos, key=lambda i: i.header_offset):
+            member_end = self._member_end(info.header_offset)
+            if group and info.header_offset - end <= MERGE_GAP:
+                group.append(info)
+                end = member_end
+                continue
+
+            if group:
+                yield start, end, group
+            group = [info]
+            start, end = info.header_offset, member_end
+
+        if group:
+            yield start, end, group
+
+    def _member_end(self, header_offset: int) -> int:
+        """Get where the next member (or the central directory) starts."""
+        position = bisect_right(self._offsets, header_offset)
+        return self._offsets[position] if position < len(self._offsets) else self._cd_offset
+
+    def _extract_member(
+        self,
+        stream: _RangeStream,
+        info: zipfile.ZipInfo,
+        target_path: Path,
+        on_bytes: Optional[Callable[[int], None]]
+    ) -> None:
+        header = stream.read_exact(LOCAL_HEADER.size)
+        fields = LOCAL_HEADER.unpack(header)
+        if fields[0] != LOCAL_HEADER_SIGNATURE:
+            raise RemoteZipError(f"Bad local header for {info.filename}")
+        stream.read_exact(fields[9] + fields[10])  # name and extra field
+
+        if info.is_dir():
+            target_path.mkdir(parents=True, exist_ok=True)
+            return
+
+        if info.flag_bits & FLAG_ENCRYPTED:
+            raise RemoteZipError(f"Encrypted member {info.filename}")
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            decompressor = zlib.decompressobj(-15)
+        elif info.compress_type == zipfile.ZIP_STORED:
+            decompressor = None
+        else:
+            raise RemoteZipError(f"Unsupported compression for {info.filename}")
+
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target_path.with_name(target_path.name + ".part")
+        remaining = info.compress_size
+        crc = 0
+
+        try:
+            with open(tmp_path, "wb") as out:
+                while remaining:
+                    raw = stream.read_exact(min(CHUNK_SIZE, remaining))
+                    remaining -= len(raw)
+                    chunk = decompressor.decompress(raw) if decompressor else raw
+                    crc = zlib.crc32(chunk, crc)
+                    out.write(chunk)
+                    if on_bytes:
+                        on_bytes(len(raw))
+
+                if decompressor:
+                    chunk = decompressor.flush()
+                    crc = zlib.crc32(chunk, crc)
+                    out.write(chunk)
+
+            if crc != info.CRC:
+                raise RemoteZipError(f"CRC mismatch for {info.filename}")
+
+            os.replace(tmp_path, target_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _central_directory_offset(self, tail: bytes, tail_offset: int) -> int:
+        """Locate the central directory from the end records in the tail."""
+        eocd = tail.rfind(END_OF_CENTRAL_DIR)
+        if eocd < 0 or len(tail) - eocd < 22:
+            raise RemoteZipError("End of central directory not found")
+
+        cd_size, cd_offset = struct.unpack("<2L", tail[eocd + 12:eocd + 20])
+        if cd_offset != 0xFFFFFFFF and cd_size != 0xFFFFFFFF:
+            return cd_offset
+
+        # Zip64: the locator sits right before the end record and points
+        # at the Zip64 end record, which follows the central directory
+        locator = eocd - 20
+        if locator < 0 or tail[locator:locator + 4] != ZIP64_LOCATOR:
+            raise RemoteZipError("Zip64 end of central directory locator not found")
+
+        record_offset = struct.unpack("<Q", tail[locator + 8:locator + 16])[0] - tail_offset
+        if record_offset < 0:
+            raise RemoteZipError("Zip64 end of central directory outside fetched tail")
+        return struct.unpack("<Q", tail[record_offset + 48:record_offset + 56])[0]
+
+    def _request(self, byte_range: str):
+        request = Request(self.url)
+        request.add_header("Range", byte_range)
+        # If-Range needs a strong validator; a weak ETag never matches
+        strong_etag = self.etag if self.etag and not self.etag.startswith("W/") else None
+        validator = strong_etag or self.last_modified
+        if validator:
+            request.add_header("If-Range", validator)
+
+        response = urlopen(request, timeout=self.timeout)
+        if response.status != 206:
+            response.close()
+            raise RemoteZipError("Server did not honour the byte range (no Range support or archive changed)")
+        return response
+
+    def _read_all(self, response) -> bytes:
+        data = response.read()
+        self.fetched += len(data)
+        return data
+
+    @staticmethod
+    def _total_size(response) -> int:
+        """Parse the total size from a Content-Range header."""
+        content_range = response.headers.get("Content-Range", "")
+        try:
+            return int(content_range.rsplit("/", 1)[1])
+        except (IndexError, ValueError) as e:
+            raise RemoteZipError(f"Unusable Content-Range {content_range!r}") from e
+
+
+class _RangeStream:
+    """Sequential reader over one ranged response, tracking the file offset."""
+
+    def __init__(self, response, offset: int, remote: RemoteZip) -> None:
+        self._response = response
+        self._remote = remote
+        self.offset = offset
+
+    def read_exact(self, size: int) -> bytes:
+        data = self._response.read(size)
+        if len(data) != size:
+            raise RemoteZipError("Remote archive ended early")
+        self.offset += size
+        self._remote.fetched += size
+        return data
+
+    def skip_to(self, offset: int) -> None:
+        while self.offset < offset:
+            self.read_exact(min(CHUNK_SIZE, offset - self.offset))
@@ -104,17 +104,37 @@ def main_menu() -> None:
         (
             "Backup Current Setup",
             "backup",
-            "Create a timestamped backup of your current add-on settings and configuration. Backups are stored locally."
+            "Snapshot your current add-on settings and configuration. Only files changed since the last backup take up new space."
+        ),
+        (
+            "Export Backup Zip",
+            "export_backup",
+            "Save your add-on settings and configuration as a single zip file, e.g. to copy to another device."
         ),
         (
             "Restore Backup",
             "restore",
-            "Restore Kodi configuration from a previous backup."
+            "Restore Kodi configuration from a previous backup snapshot or exported zip."
+        ),
+        (
+            "Roll Back Last Install",
+            "rollback",
+            "Restore the add-ons and settings that the last Fresh Install replaced. Only the most recent install can be rolled back."
         ),
         (
             "Clear Cache",
             "clear_cache",
-            "Clear thumbnails, temporary files, and texture database to free up space and resolve image issues."
+            "Clear temporary files, and trim thumbnails to the most recently used or clear them along with the texture database."
+        ),
+        (
+            "Tune Streaming Cache",
+            "tune_cache",
+            "Size Kodi's video cache for this device's memory and connection speed to reduce buffering on high-bitrate streams."
+        ),
+        (
+            "Optimize Databases",
+            "optimize_databases",
+            "Check and compact the video library, texture, add-on, EPG and scraper cache databases to keep browsing and widgets fast."
         ),
         (
             "Build Information",
@@ -169,8 +189,12 @@ def run() -> None:
         "update_build": wiz.update_build,
         "configure_debrid": wiz.configure_debrid,
         "backup": wiz.create_backup,
+        "export_backup": wiz.export_backup,
         "restore": wiz.restore_backup,
+        "rollback": wiz.rollback_install,
         "clear_cache": wiz.clear_cache,
+        "tune_cache": wiz.tune_cache,
+        "optimize_databases": wiz.optimize_databases,
         "build_info": show_build_info,
     }
 
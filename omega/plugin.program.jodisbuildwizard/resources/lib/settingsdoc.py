@@ -0,0 +1,119 @@
+"""
+Kodi settings XML files (settings.xml, guisettings.xml).
+Standard library only (no xbmc imports) so build scripts can share it.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(tree: ET.ElementTree, path: Path, indent: Optional[str] = None) -> None:
+    """
+    Write an XML tree through a temporary file renamed over the target.
+
+    A crash mid-write leaves the previous file intact instead of a
+    truncated one Kodi would discard.
+
+    Args:
+        tree: Tree to write
+        path: Destination file
+        indent: Indentation per level (None = leave whitespace as is)
+    """
+    if indent is not None:
+        ET.indent(tree, space=indent)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            tree.write(f, encoding="unicode", xml_declaration=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class SettingsDocument:
+    """
+    A settings file parsed once, with an index from setting ID to element.
+
+    Changes are applied in memory and written in one pass by save(), so
+    setting many values costs one parse and one write, not one of each
+    per value.
+    """
+
+    def __init__(self, path: Path, root: Optional[ET.Element] = None) -> None:
+        self.path = path
+        self.root = root if root is not None else ET.Element("settings", version="2")
+        self.changed = False
+
+        # First element per ID, as root.find(".//setting[@id=...]") would pick
+        self._index: Dict[str, ET.Element] = {}
+        for elem in self.root.iter("setting"):
+            setting_id = elem.get("id")
+            if setting_id is not None:
+                self._index.setdefault(setting_id, elem)
+
+    @classmethod
+    def load(cls, path: Path) -> SettingsDocument:
+        """
+        Parse a settings file, or start an empty one if it does not exist.
+
+        Raises:
+            ET.ParseError: File exists but is not valid XML
+        """
+        if not path.exists():
+            return cls(path)
+        return cls(path, ET.parse(path).getroot())
+
+    def get(self, setting_id: str, default: Optional[str] = None) -> Optional[str]:
+        """Get a setting's value."""
+        elem = self._index.get(setting_id)
+        return elem.text if elem is not None else default
+
+    def set(self, setting_id: str, value: str) -> None:
+        """Set a setting's value, adding the setting if it is missing."""
+        elem = self._index.get(setting_id)
+        if elem is None:
+            elem = ET.SubElement(self.root, "setting", id=setting_id)
+            self._index[setting_id] = elem
+        elif elem.text == value:
+            return
+
+        elem.text = value
+        # Kodi marks untouched settings default="true"; this one no longer is
+        elem.attrib.pop("default", None)
+        self.changed = True
+
+    def update(self, settings: Dict[str, str]) -> None:
+        """Set several settings."""
+        for setting_id, value in settings.items():
+            self.set(setting_id, value)
+
+    def save(self, indent: Optional[str] = None) -> bool:
+        """
+        Write the document if anything changed or the file is missing.
+
+        Args:
+            indent: Indentation per level (None = leave whitespace as is)
+
+        Returns:
+            True if the file was written
+        """
+        if not self.changed and self.path.exists():
+            return False
+
+        write_atomic(ET.ElementTree(self.root), self.path, indent)
+        self.changed = False
+        logger.debug(f"Wrote {self.path}")
+        return True
@@ -0,0 +1,352 @@
+"""
+Content-addressed snapshot backups.
+
+Layout under the store root:
+    objects/<2 hex>/<sha256>   zlib stream of one unique file
+    snapshots/<timestamp>.json manifest: path -> [size, mtime_ns, sha256]
+
+Timestamps carry microseconds, so snapshots taken in the same second do
+not overwrite each other. Older stores named them to the second.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import archive
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[float, str], None]
+
+SNAPSHOT_FORMAT = 1
+NAME_FORMAT = "%Y%m%d_%H%M%S_%f"
+LEGACY_NAME_FORMAT = "%Y%m%d_%H%M%S"
+PROGRESS_INTERVAL = 0.25
+
+# Hashing less than this says little about throughput
+RATE_MIN_BYTES = 4 * 1024 * 1024
+
+
+class SnapshotCancelled(Exception):
+    """Snapshot was cancelled; nothing was recorded."""
+
+
+class SnapshotError(Exception):
+    """Snapshot data needed for a restore is missing or unreadable."""
+
+
+class SnapshotStore:
+    """
+    Keeps every unique file once, keyed by SHA-256, with one small
+    manifest per snapshot.
+
+    A file whose size and mtime match the previous snapshot reuses its
+    hash without being read. Restores only rewrite files that differ from
+    what is on disk.
+    """
+
+    def __init__(self, root: Path, policy: Optional[archive.CompressionPolicy] = None) -> None:
+        self.root = root
+        self.objects_dir = root / "objects"
+        self.snapshots_dir = root / "snapshots"
+        self.policy = policy or archive.CompressionPolicy()
+
+    def snapshots(self) -> List[Path]:
+        """Get snapshot manifests, newest first."""
+        if not self.snapshots_dir.exists():
+            return []
+        return sorted(self.snapshots_dir.glob("*.json"), reverse=True)
+
+    @staticmethod
+    def created_at(manifest_path: Path) -> datetime:
+        """
+        Get when a snapshot was taken, from its manifest name.
+
+        Raises:
+            ValueError: Name is not a snapshot timestamp
+        """
+        try:
+            return datetime.strptime(manifest_path.stem, NAME_FORMAT)
+        except ValueError:
+            return datetime.strptime(manifest_path.stem, LEGACY_NAME_FORMAT)
+
+    @staticmethod
+    def load(manifest_path: Path) -> Dict[str, object]:
+        """
+        Load a snapshot manifest.
+
+        Returns:
+            Dict with format, created, size and files keys
+        """
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+    def latest(self) -> Dict[str, object]:
+        """Get the newest readable snapshot manifest, or an empty dict."""
+        for manifest_path in self.snapshots():
+            try:
+                manifest = self.load(manifest_path)
+            except (OSError, ValueError):
+                continue
+            if isinstance(manifest.get("files"), dict):
+                return manifest
+        return {}
+
+    def create(
+        self,
+        files: Iterable[Tuple[Path, str]],
+        progress_callback: Optional[ProgressCallback] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None
+    ) -> Tuple[Path, Dict[str, int]]:
+        """
+        Record a snapshot of files.
+
+        Args:
+            files: (path on disk, relative name) pairs
+            progress_callback: Function(progress: 0-1, message: str)
+            is_cancelled: Polled between files; True abandons the snapshot
+
+        Returns:
+            (manifest path, counts of files, reused, hashed, new_objects,
+            new_bytes, hashed_bytes and size)
+
+        Raises:
+            SnapshotCancelled: is_cancelled returned True
+        """
+        files = list(files)
+        latest = self.latest()
+        previous = latest.get("files", {})
+        entries: Dict[str, List] = {}
+        stats = {
+            "files": 0, "reused": 0, "hashed": 0, "new_objects": 0,
+            "new_bytes": 0, "hashed_bytes": 0, "size": 0,
+        }
+        hash_seconds = 0.0
+        last_report = 0.0
+
+        for i, (file_path, rel_path) in enumerate(files):
+            if is_cancelled and is_cancelled():
+                raise SnapshotCancelled("Snapshot cancelled")
+
+            now = time.monotonic()
+            if progress_callback and now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                progress_callback(i / len(files), f"Backing up: {Path(rel_path).name}")
+
+            try:
+                stat = file_path.stat()
+                entry = previous.get(rel_path)
+
+                if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns \
+                        and self._object_path(entry[2]).exists():
+                    sha256 = entry[2]
+                    stats["reused"] += 1
+                else:
+                    start = time.perf_counter()
+                    sha256, stored = self._store(file_path, rel_path)
+                    hash_seconds += time.perf_counter() - start
+                    stats["hashed"] += 1
+                    stats["hashed_bytes"] += stat.st_size
+                    if stored:
+                        stats["new_objects"] += 1
+                        stats["new_bytes"] += stored
+            except OSError as e:
+                logger.warning(f"Could not back up {file_path}: {e}")
+                continue
+
+            entries[rel_path] = [stat.st_size, stat.st_mtime_ns, sha256]
+            stats["files"] += 1
+            stats["size"] += stat.st_size
+
+        # Bytes per second of hashing and storing, for backup estimates
+        rate = latest.get("rate")
+        if stats["hashed_bytes"] >= RATE_MIN_BYTES and hash_seconds > 0:
+            rate = int(stats["hashed_bytes"] / hash_seconds)
+
+        created = datetime.now()
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "created": created.isoformat(timespec="seconds"),
+            "size": stats["size"],
+            "rate": rate,
+            "files": entries,
+        }
+
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = self.snapshots_dir / f"{created.strftime(NAME_FORMAT)}.json"
+        tmp_path = manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp_path, manifest_path)
+
+        logger.info(
+            f"Snapshot {manifest_path.name}: {stats['files']} files, "
+            f"{stats['reused']} unchanged, {stats['new_objects']} new objects "
+            f"({stats['new_bytes'] / (1024 * 1024):.1f} MB)"
+        )
+        return manifest_path, stats
+
+    def restore(
+        self,
+        manifest: Dict[str, object],
+        destination: Path,
+        names: Optional[Iterable[str]] = None,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Tuple[int, int]:
+        """
+        Restore files from a snapshot, writing only those that differ.
+
+        A file is left alone when its size matches and either its mtime
+        matches or its content hashes the same.
+
+        Args:
+            manifest: Loaded snapshot manifest
+            destination: Directory the relative names are restored under
+            names: Subset of relative names to restore (None = all)
+            progress_callback: Function(progress: 0-1, message: str)
+
+        Returns:
+            (files written, files already up to date)
+
+        Raises:
+            SnapshotError: An object the snapshot needs is missing or corrupt
+        """
+        files: Dict[str, List] = manifest["files"]
+        selected = list(files) if names is None else [n for n in names if n in files]
+        written = unchanged = 0
+        last_report = 0.0
+
+        for i, rel_path in enumerate(selected):
+            size, mtime_ns, sha256 = files[rel_path]
+            target_path = destination / rel_path
+
+            now = time.monotonic()
+            if progress_callback and now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                progress_callback(i / len(selected), f"Restoring: {target_path.name}")
+
+            if self._matches(target_path, size, mtime_ns, sha256):
+                unchanged += 1
+                continue
+
+            object_path = self._object_path(sha256)
+            try:
+                src = open(object_path, "rb")
+            except OSError as e:
+                raise SnapshotError(f"Snapshot object missing for {rel_path}: {object_path.name}") from e
+
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target_path.with_name(target_path.name + ".restore")
+            decompressor = zlib.decompressobj()
+
+            try:
+                with src, open(tmp_path, "wb") as dst:
+                    for chunk in iter(lambda: src.read(archive.COPY_BUFFER_SIZE), b""):
+                        dst.write(decompressor.decompress(chunk))
+                    dst.write(decompressor.flush())
+            except zlib.error as e:
+                tmp_path.unlink()
+                raise SnapshotError(f"Snapshot object corrupt for {rel_path}: {object_path.name}") from e
+
+            os.replace(tmp_path, target_path)
+            os.utime(target_path, ns=(mtime_ns, mtime_ns))
+            written += 1
+
+        logger.info(f"Restored {written} files to {destination} ({unchanged} already up to date)")
+        return written, unchanged
+
+    def expire(self, keep: int) -> int:
+        """
+        Delete all but the newest snapshots and any objects they alone used.
+
+        Args:
+            keep: Number of snapshots to keep
+
+        Returns:
+            Number of objects deleted
+        """
+        for manifest_path in self.snapshots()[keep:]:
+            manifest_path.unlink()
+            logger.info(f"Expired snapshot {manifest_path.name}")
+
+        referenced = set()
+        for manifest_path in self.snapshots():
+            try:
+                referenced.update(entry[2] for entry in self.load(manifest_path)["files"].values())
+            except (OSError, ValueError, KeyError):
+                # An unreadable manifest keeps everything alive
+                logger.warning(f"Could not read {manifest_path}; skipping object cleanup")
+                return 0
+
+        deleted = 0
+        if self.objects_dir.exists():
+            for object_path in self.objects_dir.glob("*/*"):
+                if object_path.name not in referenced:
+                    object_path.unlink()
+                    deleted += 1
+
+        return deleted
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / sha256
+
+    def _store(self, file_path: Path, rel_path: str) -> Tuple[str, int]:
+        """
+        Hash a file and add it to the object store if it is new.
+
+        Compresses into a temporary object while hashing, so each changed
+        file is read once.
+
+        Returns:
+            (SHA-256 hex digest, bytes added to the store or 0 if known)
+        """
+        _, level = self.policy.select(rel_path)
+        compressor = zlib.compressobj(0 if level is None else level)
+        digest = hashlib.sha256()
+
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.objects_dir / f"incoming-{os.getpid()}.tmp"
+
+        try:
+            with open(file_path, "rb") as src, open(tmp_path, "wb") as dst:
+                for chunk in iter(lambda: src.read(archive.COPY_BUFFER_SIZE), b""):
+                    digest.update(chunk)
+                    dst.write(compressor.compress(chunk))
+                dst.write(compressor.flush())
+
+            sha256 = digest.hexdigest()
+            object_path = self._object_path(sha256)
+            if object_path.exists():
+                return sha256, 0
+
+            object_path.parent.mkdir(exist_ok=True)
+            stored = tmp_path.stat().st_size
+            os.replace(tmp_path, object_path)
+            return sha256, stored
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _matches(self, file_path: Path, size: int, mtime_ns: int, sha256: str) -> bool:
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return False
+
+        if stat.st_size != size:
+            return False
+        if stat.st_mtime_ns == mtime_ns:
+            return True
+
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(archive.COPY_BUFFER_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest() == sha256
@@ -5,14 +5,19 @@ Handles download, extraction, backup, restore, and configuration tasks.
 
 from __future__ import annotations
 
-import hashlib
+import http.client
+import json
+import os
+import threading
+import time
 import zipfile
 import shutil
-import fnmatch
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Callable, List, Dict
-from urllib.request import urlretrieve, urlopen
+from typing import Optional, Callable, List, Dict, Tuple
+from urllib.request import Request, urlopen
 from urllib.error import URLError, HTTPError
 import xml.etree.ElementTree as ET
 import logging
@@ -22,7 +27,13 @@ import xbmcgui
 import xbmcvfs
 import xbmcaddon
 
+from . import archive
 from . import config
+from . import database
+from . import downloader
+from . import remotezip
+from . import settingsdoc
+from . import snapshots
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +46,14 @@ class BuildWizard:
     All filesystem operations use Kodi's special:// path translation.
     """
 
-    CHUNK_SIZE = 1024 * 1024  # 1MB download chunks
+    CHUNK_SIZE = 1024 * 1024  # 1MB copy buffer bounds memory per extracted file
+    PROGRESS_INTERVAL = 0.25  # seconds between extraction progress updates
+
+    # Fresh installs extract here, then rename into place unit by unit;
+    # the units they replace are kept for rollback
+    STAGING_DIR = ".jodis_staging"
+    ROLLBACK_DIR = ".jodis_rollback"
+    DISCARD_DIR = ".jodis_discard"
 
     def __init__(self) -> None:
         self.addon = xbmcaddon.Addon()
@@ -46,6 +64,13 @@ class BuildWizard:
         self.temp_dir = Path(xbmcvfs.translatePath("special://temp"))
         self.profile_dir = Path(xbmcvfs.translatePath("special://profile"))
         self.addon_data = self.kodi_home / "userdata" / "addon_data"
+        self.wizard_data = self.addon_data / self.addon.getAddonInfo("id")
+        self.install_state_path = self.wizard_data / "install_state.json"
+        self.extract_index_path = self.wizard_data / "extract_index.json"
+
+        # Validators from the last build download, recorded after install
+        self.download_headers: Dict[str, str] = {}
+        self.download_digest: Optional[str] = None
 
     def fresh_install(self) -> None:
         """
@@ -74,10 +99,16 @@ class BuildWizard:
         progress.create(f"Installing {config.BUILD_NAME}", "Initializing...")
 
         try:
+            # Note which build is being installed before downloading it
+            channel = self._fetch_channel()
+            expected = self._expected_checksum(channel)
+
             # Download build archive
             progress.update(0, "Downloading build...")
             build_zip = self._download_build(
-                lambda p, m: progress.update(int(p * 40), m)
+                lambda p, m: progress.update(int(p * 40), m),
+                progress.iscanceled,
+                algorithm=expected[0] if expected else None
             )
 
             if not build_zip or progress.iscanceled():
@@ -85,7 +116,7 @@ class BuildWizard:
 
             # Verify checksum
             progress.update(42, "Verifying file integrity...")
-            if not self._verify_checksum(build_zip):
+            if not self._verify_checksum(expected):
                 if not dialog.yesno(
                     "Checksum Warning",
                     "Could not verify file integrity.\n"
@@ -94,17 +125,18 @@ class BuildWizard:
                 ):
                     raise RuntimeError("Installation cancelled - checksum verification failed")
 
-            # Extract build
+            # Extract build beside the live tree, then swap it in
             progress.update(45, "Extracting files...")
-            self._extract_archive(
+            addon_versions = self._addon_versions()
+            self._install_staged(
                 build_zip,
-                self.kodi_home,
                 progress_callback=lambda p, m: progress.update(45 + int(p * 45), m)
             )
 
             # Post-install configuration
             progress.update(92, "Configuring Kodi...")
-            self._post_install_setup()
+            self._post_install_setup(addon_versions)
+            self._record_installed_build(channel)
 
             # Cleanup temp file
             progress.update(96, "Cleaning up...")
@@ -144,36 +176,65 @@ class BuildWizard:
             return
 
         progress = xbmcgui.DialogProgress()
-        progress.create(f"Updating {config.BUILD_NAME}", "Downloading...")
+        progress.create(f"Updating {config.BUILD_NAME}", "Checking for updates...")
+
+        update_available, channel = self._check_for_update()
+        if not update_available:
+            progress.close()
+            installed = self._load_install_state().get("version", "")
+            if not dialog.yesno(
+                "Up to Date",
+                f"{config.BUILD_NAME} {installed} is already installed.\n\n"
+                "Download and reinstall the add-ons anyway?"
+            ):
+                return
+            progress.create(f"Updating {config.BUILD_NAME}", "Downloading...")
+
+        addon_versions = self._addon_versions()
 
         try:
-            # Download build
-            build_zip = self._download_build(
-                lambda p, m: progress.update(int(p * 50), m)
+            # Fetch only the changed files when the server supports ranges
+            delta = config.DELTA_UPDATES and self._delta_update(
+                lambda p, m: progress.update(int(p * 95), m),
+                progress.iscanceled
             )
 
-            if not build_zip or progress.iscanceled():
-                raise RuntimeError("Download failed or cancelled")
+            if not delta:
+                expected = self._expected_checksum(channel)
 
-            progress.update(52, "Verifying...")
-            self._verify_checksum(build_zip)  # Non-fatal for updates
+                # Download build
+                build_zip = self._download_build(
+                    lambda p, m: progress.update(int(p * 50), m),
+                    progress.iscanceled,
+                    algorithm=expected[0] if expected else None
+                )
 
-            # Extract only addons directory
-            progress.update(55, "Updating add-ons...")
-            self._extract_archive(
-                build_zip,
-                self.kodi_home,
-                include_patterns=["addons/*"],
-                exclude_patterns=["addon_data/*", "userdata/*"],
-                progress_callback=lambda p, m: progress.update(55 + int(p * 40), m)
-            )
+                if not build_zip or progress.iscanceled():
+                    raise RuntimeError("Download failed or cancelled")
+
+                progress.update(52, "Verifying...")
+                self._verify_checksum(expected)  # Non-fatal for updates
+
+                # Extract only addons directory
+                progress.update(55, "Updating add-ons...")
+                self._extract_archive(
+                    build_zip,
+                    self.kodi_home,
+                    include_patterns=config.UPDATE_INCLUDE_PATTERNS,
+                    exclude_patterns=config.UPDATE_EXCLUDE_PATTERNS,
+                    progress_callback=lambda p, m: progress.update(55 + int(p * 40), m),
+                    skip_unchanged=True,
+                    prune=config.UPDATE_PRUNE_REMOVED,
+                    jobs=config.EXTRACT_WORKERS
+                )
 
-            # Force addon database refresh
-            progress.update(96, "Refreshing addon database...")
-            self._refresh_addon_database()
+                if build_zip.exists():
+                    build_zip.unlink()
 
-            if build_zip.exists():
-                build_zip.unlink()
+            # Record changed add-ons in the addon database
+            progress.update(96, "Refreshing addon database...")
+            self._refresh_addon_database(addon_versions)
+            self._record_installed_build(channel)
 
             progress.close()
 
@@ -275,12 +336,60 @@ class BuildWizard:
 
     def create_backup(self) -> None:
         """
-        Create timestamped backup of user configuration.
+        Snapshot user configuration into the deduplicated backup store.
+        Files unchanged since the last snapshot are skipped by size and
+        modification time; each unique file is stored once.
+        """
+        dialog = xbmcgui.Dialog()
+        progress = xbmcgui.DialogProgress()
+        progress.create("Creating Backup", "Scanning files...")
+
+        try:
+            store = self._snapshot_store()
+            plan = self._plan_backup()
+            progress.close()
+
+            files_to_backup = self._confirm_backup(dialog, plan, store.latest())
+            if files_to_backup is None:
+                return
+
+            if not files_to_backup:
+                dialog.ok("No Data", "No configuration data found to backup.")
+                return
+
+            progress.create("Creating Backup", "Backing up...")
+            manifest_path, stats = store.create(
+                files_to_backup,
+                progress_callback=lambda p, m: progress.update(int(p * 100), m),
+                is_cancelled=progress.iscanceled
+            )
+            store.expire(config.BACKUP_KEEP)
+
+            progress.close()
+
+            dialog.ok(
+                "Backup Complete",
+                f"Backup saved successfully.\n\n"
+                f"Snapshot: {manifest_path.stem}\n"
+                f"Files: {stats['files']} ({stats['reused']} unchanged)\n"
+                f"New data stored: {stats['new_bytes'] / (1024 * 1024):.1f} MB"
+            )
+
+        except snapshots.SnapshotCancelled:
+            progress.close()
+        except Exception as e:
+            progress.close()
+            logger.exception("Backup failed")
+            dialog.ok("Backup Failed", str(e))
+
+    def export_backup(self) -> None:
+        """
+        Export user configuration as a standalone timestamped zip.
         Backs up addon_data and userdata directories.
         """
         dialog = xbmcgui.Dialog()
         progress = xbmcgui.DialogProgress()
-        progress.create("Creating Backup", "Preparing...")
+        progress.create("Creating Backup", "Scanning files...")
 
         backup_dir = self.kodi_home / "backups"
         backup_dir.mkdir(exist_ok=True)
@@ -290,26 +399,26 @@ class BuildWizard:
         backup_path = backup_dir / backup_name
 
         try:
-            # Collect files to backup
-            files_to_backup: List[tuple] = []
-            
-            for dir_name in config.BACKUP_DIRS:
-                source_dir = self.kodi_home / dir_name
-                if not source_dir.exists():
-                    continue
+            plan = self._plan_backup()
+            progress.close()
 
-                for file_path in source_dir.rglob("*"):
-                    if file_path.is_file() and not self._should_exclude(file_path):
-                        rel_path = file_path.relative_to(self.kodi_home)
-                        files_to_backup.append((file_path, rel_path))
+            files_to_backup = self._confirm_backup(dialog, plan)
+            if files_to_backup is None:
+                return
 
             if not files_to_backup:
-                progress.close()
                 dialog.ok("No Data", "No configuration data found to backup.")
                 return
 
+            progress.create("Creating Backup", "Backing up...")
+
             # Create backup archive
             total_files = len(files_to_backup)
+            policy = archive.CompressionPolicy(
+                default_level=config.BACKUP_COMPRESS_LEVEL,
+                levels={}
+            )
+            stats = archive.CompressionStats(sample_level=config.BACKUP_COMPRESS_LEVEL)
             
             with zipfile.ZipFile(backup_path, "w", zipfile.ZIP_DEFLATED) as zf:
                 for i, (file_path, arc_path) in enumerate(files_to_backup):
@@ -321,15 +430,18 @@ class BuildWizard:
 
                     progress.update(
                         int((i / total_files) * 100),
-                        f"Backing up: {arc_path.name}"
+                        f"Backing up: {Path(arc_path).name}"
                     )
                     
                     try:
-                        zf.write(file_path, arc_path)
+                        archive.write_member(
+                            zf, file_path, arc_path, policy, stats
+                        )
                     except (OSError, PermissionError) as e:
                         logger.warning(f"Could not backup {file_path}: {e}")
 
             progress.close()
+            logger.info(f"Backup compression: {stats.summary()}")
 
             backup_size = backup_path.stat().st_size / (1024 * 1024)
             dialog.ok(
@@ -349,7 +461,7 @@ class BuildWizard:
 
     def restore_backup(self) -> None:
         """
-        Restore configuration from existing backup.
+        Restore configuration from a snapshot or an exported backup zip.
         """
         dialog = xbmcgui.Dialog()
         backup_dir = self.kodi_home / "backups"
@@ -358,36 +470,56 @@ class BuildWizard:
             dialog.ok("No Backups", "Backup directory not found.")
             return
 
-        # List available backups (newest first)
-        backups = sorted(backup_dir.glob("backup_*.zip"), reverse=True)
+        store = self._snapshot_store()
 
-        if not backups:
-            dialog.ok("No Backups", "No backup files found.")
-            return
+        # Snapshots and exported zips, newest first
+        choices: List[Tuple[str, Path, str]] = []
+        for manifest_path in store.snapshots():
+            try:
+                manifest = store.load(manifest_path)
+                dt = store.created_at(manifest_path)
+            except (OSError, ValueError):
+                continue
+            size_mb = manifest.get("size", 0) / (1024 * 1024)
+            label = f"{dt.strftime('%Y-%m-%d %H:%M')} - snapshot ({len(manifest['files'])} files, {size_mb:.1f} MB)"
+            choices.append((manifest_path.stem, manifest_path, label))
 
-        # Format backup names with dates
-        backup_labels = []
-        for b in backups:
+        for b in backup_dir.glob("backup_*.zip"):
             size_mb = b.stat().st_size / (1024 * 1024)
             # Parse timestamp from filename
+            ts = b.stem.replace("backup_", "")
             try:
-                ts = b.stem.replace("backup_", "")
                 dt = datetime.strptime(ts, "%Y%m%d_%H%M%S")
-                label = f"{dt.strftime('%Y-%m-%d %H:%M')} ({size_mb:.1f} MB)"
+                label = f"{dt.strftime('%Y-%m-%d %H:%M')} - zip ({size_mb:.1f} MB)"
             except ValueError:
                 label = f"{b.name} ({size_mb:.1f} MB)"
-            backup_labels.append(label)
+            choices.append((ts, b, label))
 
-        selection = dialog.select("Select Backup to Restore", backup_labels)
+        if not choices:
+            dialog.ok("No Backups", "No backups found.")
+            return
+
+        choices.sort(key=lambda choice: choice[0], reverse=True)
+        selection = dialog.select("Select Backup to Restore", [label for _, _, label in choices])
 
         if selection < 0:
             return
 
-        selected_backup = backups[selection]
+        selected_backup = choices[selection][1]
+
+        try:
+            contents = self._backup_contents(selected_backup, store)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            dialog.ok("Restore Failed", f"Could not read backup:\n{e}")
+            return
+
+        names = self._choose_restore_groups(dialog, contents)
+        if not names:
+            return
 
         if not dialog.yesno(
             "Confirm Restore",
-            f"Restore from:\n{selected_backup.name}\n\n"
+            f"Restore {len(names)} of {len(contents)} files from:\n{selected_backup.name}\n\n"
             "This will overwrite your current settings.\n"
             "Continue?"
         ):
@@ -397,17 +529,29 @@ class BuildWizard:
         progress.create("Restoring Backup", "Extracting...")
 
         try:
-            self._extract_archive(
-                selected_backup,
-                self.kodi_home,
-                progress_callback=lambda p, m: progress.update(int(p * 100), m)
-            )
+            if selected_backup.suffix == ".json":
+                written, unchanged = store.restore(
+                    store.load(selected_backup),
+                    self.kodi_home,
+                    names=names,
+                    progress_callback=lambda p, m: progress.update(int(p * 100), m)
+                )
+                summary = f"{written} files restored, {unchanged} already up to date."
+            else:
+                self._extract_archive(
+                    selected_backup,
+                    self.kodi_home,
+                    progress_callback=lambda p, m: progress.update(int(p * 100), m),
+                    jobs=config.EXTRACT_WORKERS,
+                    names=names
+                )
+                summary = "Configuration has been restored."
 
             progress.close()
 
             if dialog.yesno(
                 "Restore Complete",
-                "Configuration has been restored.\n\n"
+                f"{summary}\n\n"
                 "Restart Kodi to apply changes?"
             ):
                 xbmc.executebuiltin("RestartApp")
@@ -417,13 +561,83 @@ class BuildWizard:
             logger.exception("Restore failed")
             dialog.ok("Restore Failed", str(e))
 
+    @staticmethod
+    def _backup_contents(backup_path: Path, store: snapshots.SnapshotStore) -> Dict[str, int]:
+        """
+        List the files in a backup without extracting anything.
+        
+        Snapshots are listed from their manifest and zips from their
+        central directory.
+        
+        Args:
+            backup_path: Snapshot manifest or backup zip
+            store: Store the snapshot belongs to
+            
+        Returns:
+            Dict of relative name -> uncompressed size
+        """
+        if backup_path.suffix == ".json":
+            return {name: entry[0] for name, entry in store.load(backup_path)["files"].items()}
+
+        with zipfile.ZipFile(backup_path, "r") as zf:
+            return {info.filename: info.file_size for info in zf.infolist() if not info.is_dir()}
+
+    @staticmethod
+    def _choose_restore_groups(dialog: xbmcgui.Dialog, contents: Dict[str, int]) -> List[str]:
+        """
+        Let the user pick which add-ons to restore.
+        
+        Files outside addons and addon_data form one "Kodi settings" group.
+        
+        Args:
+            dialog: Dialog to ask with
+            contents: Result of _backup_contents
+            
+        Returns:
+            Names of the files in the chosen groups (empty if cancelled)
+        """
+        groups: Dict[str, List[str]] = {}
+        for name in contents:
+            groups.setdefault(archive.owning_addon(name) or "", []).append(name)
+
+        if len(groups) < 2:
+            return list(contents)
+
+        # Kodi's own settings first, then add-ons by ID
+        keys = sorted(groups)
+        labels = []
+        for key in keys:
+            size_mb = sum(contents[name] for name in groups[key]) / (1024 * 1024)
+            label = key or "Kodi settings and databases"
+            labels.append(f"{label} ({len(groups[key])} files, {size_mb:.1f} MB)")
+
+        selected = dialog.multiselect(
+            "Select What to Restore",
+            labels,
+            preselect=list(range(len(keys)))
+        )
+        if not selected:
+            return []
+
+        return [name for i in selected for name in groups[keys[i]]]
+
     def clear_cache(self) -> None:
         """
-        Clear Kodi cache, thumbnails, and texture database.
+        Clear Kodi cache and temporary files, and either trim the thumbnail
+        cache to its most recently used images or clear it entirely.
         """
         dialog = xbmcgui.Dialog()
+        target_mb = config.THUMBNAIL_CACHE_TARGET_MB
 
-        if not dialog.yesno(
+        mode = dialog.select("Clear Cache", [
+            f"Trim thumbnails to {target_mb} MB (keeps recently used)",
+            "Clear everything",
+        ])
+        if mode < 0:
+            return
+
+        trim = mode == 0
+        if not trim and not dialog.yesno(
             "Clear Cache",
             "This will delete:\n"
             "• Thumbnail images\n"
@@ -441,7 +655,10 @@ class BuildWizard:
         cleared_bytes = 0
         cleared_files = 0
 
+        thumbnails_dir = self.kodi_home / "userdata" / "Thumbnails"
         cache_paths = [self.kodi_home / d for d in config.CACHE_DIRS]
+        if trim:
+            cache_paths = [p for p in cache_paths if p != thumbnails_dir]
 
         for i, cache_dir in enumerate(cache_paths):
             if not cache_dir.exists():
@@ -461,17 +678,35 @@ class BuildWizard:
                     except (OSError, PermissionError):
                         pass
 
-        # Clear texture databases
-        progress.update(85, "Clearing texture database...")
         db_dir = self.kodi_home / "userdata" / "Database"
-        
-        for db_file in db_dir.glob("Textures*.db"):
-            try:
-                cleared_bytes += db_file.stat().st_size
-                db_file.unlink()
-                cleared_files += 1
-            except (OSError, PermissionError):
-                pass
+
+        if trim:
+            # Evict least recently used thumbnails and their texture rows
+            progress.update(85, "Trimming thumbnails...")
+            texture_db = database.latest_database(db_dir, "Textures")
+
+            if texture_db:
+                try:
+                    files, freed = database.TextureCache(texture_db, thumbnails_dir).evict(
+                        target_mb * 1024 * 1024
+                    )
+                    cleared_files += files
+                    cleared_bytes += freed
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning(f"Could not trim thumbnails: {e}")
+            else:
+                logger.warning("Texture database not found; thumbnails left as they are")
+        else:
+            # Clear texture databases
+            progress.update(85, "Clearing texture database...")
+
+            for db_file in db_dir.glob("Textures*.db"):
+                try:
+                    cleared_bytes += db_file.stat().st_size
+                    db_file.unlink()
+                    cleared_files += 1
+                except (OSError, PermissionError):
+                    pass
 
         progress.close()
 
@@ -482,174 +717,1058 @@ class BuildWizard:
             f"Deleted {cleared_files} files"
         )
 
+    def tune_cache(self) -> None:
+        """
+        Write guisettings.xml video cache settings for this device.
+        
+        Suggests a profile from config.CACHE_PROFILES by RAM and storage,
+        measures throughput against config.THROUGHPUT_PROBE_URL, and sizes
+        the chosen profile to both.
+        """
+        dialog = xbmcgui.Dialog()
+        progress = xbmcgui.DialogProgress()
+        progress.create("Tune Streaming Cache", "Measuring connection speed...")
+
+        ram_mb = self._total_ram_mb()
+        try:
+            storage_gb = shutil.disk_usage(self.kodi_home).total / (1024 ** 3)
+        except OSError:
+            storage_gb = 0.0
+
+        try:
+            throughput = downloader.measure_throughput(
+                config.THROUGHPUT_PROBE_URL,
+                config.THROUGHPUT_PROBE_SECONDS,
+                max_bytes=config.THROUGHPUT_PROBE_BYTES
+            )
+        except downloader.DownloadError as e:
+            logger.warning(f"Could not measure throughput: {e}")
+            throughput = 0.0
+
+        progress.close()
+
+        names = list(config.CACHE_PROFILES)
+        detected = names[0]
+        for name, profile in config.CACHE_PROFILES.items():
+            if ram_mb >= profile["min_ram_mb"] and storage_gb >= profile["min_storage_gb"]:
+                detected = name
+
+        selection = dialog.select(
+            "Select Device Profile",
+            [f"{name} (detected)" if name == detected else name for name in names],
+            preselect=names.index(detected)
+        )
+        if selection < 0:
+            return
+
+        cache = self._cache_settings(config.CACHE_PROFILES[names[selection]], ram_mb, throughput)
+        mbps = throughput * 8 / 1e6
+
+        lines = [
+            f"RAM: {ram_mb} MB" if ram_mb else "RAM: unknown",
+            f"Storage: {storage_gb:.0f} GB",
+            f"Connection: {mbps:.0f} Mbit/s" if throughput else "Connection: not measured",
+            "",
+            f"Cache memory: {cache['filecache.memorysize']} MB",
+            f"Read factor: {int(cache['filecache.readfactor']) / 100:g}x",
+        ]
+        if throughput and mbps < config.CACHE_REFERENCE_MBPS:
+            lines += ["", f"Below {config.CACHE_REFERENCE_MBPS} Mbit/s, 4K remuxes may still buffer."]
+        lines += ["", "Save these cache settings?"]
+
+        if not dialog.yesno("Tune Streaming Cache", "\n".join(lines)):
+            return
+
+        try:
+            rejected = self._write_gui_settings(cache)
+        except (OSError, ET.ParseError) as e:
+            logger.exception("Writing guisettings.xml failed")
+            dialog.ok("Tuning Failed", str(e))
+            return
+
+        if rejected:
+            dialog.ok(
+                "Tuning Failed",
+                "Kodi rejected these cache settings and keeps its current values:\n\n"
+                + "\n".join(f"{setting_id}: {error}" for setting_id, error in rejected.items())
+            )
+            return
+
+        if dialog.yesno(
+            "Cache Tuned",
+            "Streaming cache settings saved.\n\n"
+            "Restart Kodi to apply changes?"
+        ):
+            xbmc.executebuiltin("RestartApp")
+
+    @staticmethod
+    def _cache_settings(profile: Dict[str, float], ram_mb: int, throughput: float) -> Dict[str, str]:
+        """
+        Size a cache profile to the device.
+        
+        Args:
+            profile: Entry of config.CACHE_PROFILES
+            ram_mb: Total RAM in MB (0 if unknown)
+            throughput: Measured bytes per second (0 if unknown)
+            
+        Returns:
+            guisettings.xml filecache.* values
+        """
+        memorysize_mb = profile["memorysize_mb"]
+        if ram_mb:
+            memorysize_mb = min(memorysize_mb, int(ram_mb * config.CACHE_RAM_SHARE / 3))
+
+        readfactor = profile["readfactor"]
+        if throughput:
+            headroom = throughput * 8 / 1e6 / config.CACHE_REFERENCE_MBPS
+            readfactor = min(readfactor, max(config.CACHE_MIN_READFACTOR, headroom))
+
+        # Kodi stores memorysize in MB and readfactor in hundredths
+        return {
+            "filecache.buffermode": str(profile["buffermode"]),
+            "filecache.memorysize": str(memorysize_mb),
+            "filecache.readfactor": str(int(readfactor * 100)),
+        }
+
+    @staticmethod
+    def _total_ram_mb() -> int:
+        """Get total RAM in MB from Kodi, or /proc/meminfo (0 if unknown)."""
+        label = xbmc.getInfoLabel("System.Memory(total)")  # e.g. "1906MB"
+        digits = "".join(ch for ch in label if ch.isdigit())
+        if digits:
+            return int(digits)
+
+        try:
+            with open("/proc/meminfo", "r") as f:
+                for line in f:
+                    if line.startswith("MemTotal:"):
+                        return int(line.split()[1]) // 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
+
+    def _write_gui_settings(self, values: Dict[str, str]) -> Dict[str, str]:
+        """
+        Set GUI settings in the running Kodi and in userdata/guisettings.xml.
+        
+        Kodi writes its in-memory settings back to guisettings.xml on exit,
+        so a value Kodi rejects is not written to the file either: it would
+        be overwritten on restart anyway.
+        
+        Args:
+            values: Setting ID -> value, e.g. {"filecache.memorysize": "150"}
+            
+        Returns:
+            Setting ID -> error for each value Kodi rejected
+        """
+        rejected: Dict[str, str] = {}
+
+        for setting_id, value in values.items():
+            request = {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "Settings.SetSettingValue",
+                "params": {"setting": setting_id, "value": int(value)},
+            }
+            response = xbmc.executeJSONRPC(json.dumps(request))
+
+            try:
+                reply = json.loads(response)
+            except ValueError:
+                reply = {"error": {"message": f"Unreadable response: {response!r}"}}
+
+            if isinstance(reply.get("error"), dict):
+                rejected[setting_id] = str(reply["error"].get("message", reply["error"]))
+            elif reply.get("result") is not True:
+                rejected[setting_id] = f"Unexpected response: {response}"
+
+        for setting_id, error in rejected.items():
+            logger.error(f"Kodi rejected {setting_id}={values[setting_id]}: {error}")
+
+        accepted = {k: v for k, v in values.items() if k not in rejected}
+        if accepted:
+            doc = settingsdoc.SettingsDocument.load(self.kodi_home / "userdata" / "guisettings.xml")
+            doc.update(accepted)
+            doc.save()
+            logger.info(f"Updated guisettings.xml: {accepted}")
+
+        return rejected
+
+    def optimize_databases(self) -> None:
+        """
+        Integrity check, reindex, analyze and vacuum Kodi and scraper
+        databases, then report sizes and table scan times.
+        """
+        dialog = xbmcgui.Dialog()
+        db_dir = self.kodi_home / "userdata" / "Database"
+        addon_data = self.kodi_home / "userdata" / "addon_data"
+
+        db_paths = [database.latest_database(db_dir, name) for name in config.OPTIMIZE_KODI_DATABASES]
+        db_paths += [addon_data / rel_path for rel_path in config.OPTIMIZE_ADDON_DATABASES]
+        db_paths = [path for path in db_paths if path and path.is_file()]
+
+        if not db_paths:
+            dialog.ok("Optimize Databases", "No databases found.")
+            return
+
+        if not dialog.yesno(
+            "Optimize Databases",
+            f"Check and compact {len(db_paths)} databases?\n\n"
+            "Close any open library views first. This can take a few minutes on large libraries."
+        ):
+            return
+
+        progress = xbmcgui.DialogProgress()
+        progress.create("Optimizing Databases", "Working...")
+
+        mb = 1024 * 1024
+        lines = []
+        total_before = total_after = 0
+
+        for i, db_path in enumerate(db_paths):
+            progress.update(int(i / len(db_paths) * 100), f"Optimizing: {db_path.name}")
+
+            try:
+                result = database.optimize(db_path)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Could not optimize {db_path}: {e}")
+                lines.append(f"[B]{db_path.name}[/B]: failed ({e})")
+                continue
+
+            total_before += result["size_before"]
+            total_after += result["size_after"]
+
+            if result["integrity"] != "ok":
+                lines.append(f"[B]{db_path.name}[/B]: integrity check failed, left unchanged ({result['integrity']})")
+                continue
+
+            lines.append(
+                f"[B]{db_path.name}[/B]: {result['size_before'] / mb:.1f} MB -> {result['size_after'] / mb:.1f} MB, "
+                f"scan {result['scan_before'] * 1000:.1f} ms -> {result['scan_after'] * 1000:.1f} ms "
+                f"({result['seconds']:.1f}s)"
+            )
+
+        progress.close()
+
+        lines += [
+            "",
+            f"Total: {total_before / mb:.1f} MB -> {total_after / mb:.1f} MB "
+            f"({(total_before - total_after) / mb:.1f} MB freed)",
+        ]
+        dialog.textviewer("Databases Optimized", "\n".join(lines))
+
     def _download_build(
         self,
-        progress_callback: Optional[ProgressCallback] = None
+        progress_callback: Optional[ProgressCallback] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None,
+        algorithm: Optional[str] = None
     ) -> Optional[Path]:
         """
         Download build archive from configured URL.
         
+        Fetched in byte-range segments over several connections when the
+        server supports it. Interrupted downloads leave a .part file in
+        special://temp that the next attempt resumes.
+        
         Args:
             progress_callback: Function(progress: 0-1, message: str)
+            is_cancelled: Polled while downloading; True stops the download
+            algorithm: hashlib name to digest the archive with as it arrives
             
         Returns:
             Path to downloaded file or None on failure
         """
         output_path = self.temp_dir / "build_download.zip"
+        download = downloader.SegmentedDownload(
+            config.BUILD_URL,
+            output_path,
+            algorithm=algorithm,
+            max_connections=config.DOWNLOAD_CONNECTIONS
+        )
+        self.download_digest = None
 
         try:
-            # Get file size for progress tracking
-            with urlopen(config.BUILD_URL, timeout=30) as response:
-                total_size = int(response.headers.get("Content-Length", 0))
-
-            # Download with progress reporting
-            downloaded = [0]
-
-            def report_hook(block_num: int, block_size: int, total: int) -> None:
-                downloaded[0] = block_num * block_size
-                if progress_callback and total > 0:
-                    progress = min(downloaded[0] / total, 1.0)
-                    size_mb = downloaded[0] / (1024 * 1024)
-                    total_mb = total / (1024 * 1024)
-                    progress_callback(
-                        progress,
-                        f"Downloading: {size_mb:.1f} / {total_mb:.1f} MB"
-                    )
-
-            urlretrieve(config.BUILD_URL, output_path, report_hook)
-
-            logger.info(f"Downloaded build to {output_path}")
+            download.run(progress_callback, is_cancelled)
+            self.download_headers = download.validators
+            self.download_digest = download.hexdigest
             return output_path
 
-        except HTTPError as e:
-            logger.error(f"HTTP error downloading build: {e.code} {e.reason}")
+        except downloader.DownloadCancelled:
+            logger.info("Build download cancelled; partial file kept for resume")
             return None
-        except URLError as e:
-            logger.error(f"URL error downloading build: {e.reason}")
+        except downloader.DownloadError as e:
+            logger.error(f"Error downloading build: {e}")
             return None
         except OSError as e:
             logger.error(f"OS error downloading build: {e}")
-            if output_path.exists():
-                output_path.unlink()
             return None
 
-    def _verify_checksum(self, file_path: Path) -> bool:
+    def _delta_update(
+        self,
+        progress_callback: ProgressCallback,
+        is_cancelled: Callable[[], bool]
+    ) -> bool:
         """
-        Verify MD5 checksum of downloaded file.
+        Update add-ons from the published build without downloading all of it.
+        
+        Reads the remote central directory with Range requests, compares it
+        with the extraction index and fetches only the members whose size or
+        CRC32 differ, inflating each straight into place.
         
         Args:
-            file_path: Path to file to verify
+            progress_callback: Function(progress: 0-1, message: str)
+            is_cancelled: Polled between files; True stops the update
             
         Returns:
-            True if checksum matches, False otherwise
+            True if the update completed, False to fall back to a full download
         """
+        include = archive.PathMatcher(config.UPDATE_INCLUDE_PATTERNS)
+        exclude = archive.PathMatcher(config.UPDATE_EXCLUDE_PATTERNS)
+
+        def in_scope(name: str) -> bool:
+            return include.match(name) and not exclude.match(name)
+
+        remote = remotezip.RemoteZip(config.BUILD_URL)
+        index = self._load_extract_index(self.kodi_home)
+        updated = 0
+
         try:
-            with urlopen(config.CHECKSUM_URL, timeout=30) as response:
-                checksum_content = response.read().decode().strip()
-                # Handle both "hash  filename" and plain hash formats
-                expected_md5 = checksum_content.split()[0].lower()
+            members = [info for info in remote.open() if in_scope(info.filename)]
+            changed = [
+                info for info in members
+                if not self._is_extracted(info, self.kodi_home / info.filename, index)
+            ]
 
-            with open(file_path, "rb") as f:
-                actual_md5 = hashlib.md5(f.read()).hexdigest().lower()
+            total_bytes = sum(info.compress_size for info in changed) or 1
+            done_bytes = 0
+            last_report = 0.0
 
-            match = expected_md5 == actual_md5
-            logger.info(f"Checksum verification: {'passed' if match else 'failed'}")
-            return match
+            def on_bytes(num_bytes: int) -> None:
+                nonlocal done_bytes, last_report
+                done_bytes += num_bytes
+                now = time.monotonic()
+                if now - last_report >= self.PROGRESS_INTERVAL:
+                    last_report = now
+                    progress_callback(
+                        done_bytes / total_bytes,
+                        f"Updating {len(changed)} changed files: "
+                        f"{done_bytes / (1024 * 1024):.1f} MB"
+                    )
 
-        except Exception as e:
-            logger.warning(f"Checksum verification error: {e}")
+            for info in remote.extract(changed, self.kodi_home, on_bytes):
+                if not info.is_dir():
+                    stat = (self.kodi_home / info.filename).stat()
+                    index[info.filename] = [stat.st_size, stat.st_mtime_ns, info.CRC]
+                    updated += 1
+
+                if is_cancelled():
+                    self._save_extract_index(index, self.kodi_home)
+                    raise RuntimeError("Update cancelled")
+
+        except (remotezip.RemoteZipError, http.client.HTTPException, OSError) as e:
+            logger.warning(f"Delta update unavailable ({e}); downloading the full build")
+            self._save_extract_index(index, self.kodi_home)
             return False
 
+        removed = 0
+        if config.UPDATE_PRUNE_REMOVED:
+            names = {info.filename for info in members}
+            stale = [name for name in index if name not in names and in_scope(name)]
+            removed = self._remove_extracted(self.kodi_home, stale, index)
+
+        self._save_extract_index(index, self.kodi_home)
+        self.download_headers = remote.validators
+
+        logger.info(
+            f"Delta update: {updated} files updated, {removed} removed, "
+            f"{remote.fetched / 1024:.0f} KB of {remote.size / 1024:.0f} KB fetched"
+        )
+        return True
+
+    def _fetch_channel(self) -> Optional[Dict[str, object]]:
+        """
+        Fetch the published channel index for the current build.
+        
+        Returns:
+            Channel dict (version, archive, md5, sha256, ...) or None
+        """
+        try:
+            with urlopen(config.CHANNEL_URL, timeout=15) as response:
+                channel = json.loads(response.read().decode("utf-8"))
+        except (URLError, OSError, http.client.HTTPException, ValueError) as e:
+            logger.warning(f"Could not fetch build channel: {e}")
+            return None
+
+        if not isinstance(channel, dict) or not channel.get("version"):
+            logger.warning("Build channel is missing a version")
+            return None
+
+        return channel
+
+    @staticmethod
+    def _validators(headers) -> Dict[str, str]:
+        """Extract HTTP cache validators from response headers."""
+        validators = {}
+        if headers.get("ETag"):
+            validators["etag"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            validators["last_modified"] = headers["Last-Modified"]
+        return validators
+
+    def _load_install_state(self) -> Dict[str, str]:
+        """
+        Load the record of the installed build.
+        
+        Returns:
+            State dict, empty if no build has been recorded
+        """
+        try:
+            return json.loads(self.install_state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _record_installed_build(self, channel: Optional[Dict[str, object]]) -> None:
+        """
+        Record the build that was just installed for later update checks.
+        
+        Args:
+            channel: Channel index fetched before the download, if any
+        """
+        state: Dict[str, str] = {
+            "installed": datetime.now().isoformat(timespec="seconds"),
+        }
+
+        if channel:
+            for key in ("version", "archive", "md5", "sha256"):
+                if channel.get(key):
+                    state[key] = str(channel[key])
+
+        state.update(self.download_headers)
+
+        try:
+            self.wizard_data.mkdir(parents=True, exist_ok=True)
+            self.install_state_path.write_text(
+                json.dumps(state, indent=2),
+                encoding="utf-8"
+            )
+        except OSError as e:
+            logger.warning(f"Could not record installed build: {e}")
+
+    def _check_for_update(self) -> Tuple[bool, Optional[Dict[str, object]]]:
+        """
+        Check whether the published build differs from the installed one.
+        
+        Uses the channel index first, then a conditional HEAD request on
+        the build archive. Errs on the side of updating when unsure.
+        
+        Returns:
+            (update available, channel index if it could be fetched)
+        """
+        state = self._load_install_state()
+        channel = self._fetch_channel()
+
+        if not state:
+            return True, channel
+
+        if channel:
+            remote_hash = channel.get("sha256") or channel.get("md5")
+            local_hash = state.get("sha256") if channel.get("sha256") else state.get("md5")
+
+            if remote_hash and local_hash:
+                return remote_hash != local_hash, channel
+            return str(channel["version"]) != state.get("version"), channel
+
+        if not state.get("etag") and not state.get("last_modified"):
+            return True, None
+
+        request = Request(config.BUILD_URL, method="HEAD")
+        if state.get("etag"):
+            request.add_header("If-None-Match", state["etag"])
+        if state.get("last_modified"):
+            request.add_header("If-Modified-Since", state["last_modified"])
+
+        try:
+            with urlopen(request, timeout=15) as response:
+                remote = self._validators(response.headers)
+        except HTTPError as e:
+            if e.code == 304:
+                logger.info("Build not modified since last install")
+                return False, None
+            logger.warning(f"Update check failed: {e.code} {e.reason}")
+            return True, None
+        except (URLError, OSError, http.client.HTTPException) as e:
+            logger.warning(f"Update check failed: {e}")
+            return True, None
+
+        # Servers that ignore conditional headers still return validators
+        if remote.get("etag") and remote["etag"] == state.get("etag"):
+            return False, None
+
+        return True, None
+
+    def _expected_checksum(self, channel: Optional[Dict[str, object]]) -> Optional[Tuple[str, str]]:
+        """
+        Find the published checksum before downloading the build.
+        
+        Prefers SHA-256 over MD5, from the channel index first and then
+        the checksum files published beside the archive.
+        
+        Args:
+            channel: Channel index, if it could be fetched
+            
+        Returns:
+            (hashlib algorithm name, lowercase hex digest) or None
+        """
+        if channel:
+            for algorithm in ("sha256", "md5"):
+                if channel.get(algorithm):
+                    return algorithm, str(channel[algorithm]).lower()
+
+        for algorithm, url in (("sha256", config.CHECKSUM_SHA256_URL), ("md5", config.CHECKSUM_URL)):
+            try:
+                with urlopen(url, timeout=30) as response:
+                    checksum_content = response.read().decode().strip()
+                # Handle both "hash  filename" and plain hash formats
+                return algorithm, checksum_content.split()[0].lower()
+            except (URLError, OSError, http.client.HTTPException, UnicodeDecodeError, IndexError) as e:
+                logger.debug(f"No {algorithm} checksum at {url}: {e}")
+
+        logger.warning("No published checksum found for the build")
+        return None
+
+    def _verify_checksum(self, expected: Optional[Tuple[str, str]]) -> bool:
+        """
+        Verify the digest computed while downloading against the published one.
+        
+        Args:
+            expected: (algorithm, hex digest) from _expected_checksum
+            
+        Returns:
+            True if checksum matches, False otherwise
+        """
+        if not expected or not self.download_digest:
+            logger.warning("Checksum verification skipped: no checksum available")
+            return False
+
+        algorithm, expected_hash = expected
+        match = expected_hash == self.download_digest.lower()
+        logger.info(f"Checksum verification ({algorithm}): {'passed' if match else 'failed'}")
+        return match
+
     def _extract_archive(
         self,
         archive_path: Path,
         destination: Path,
         include_patterns: Optional[List[str]] = None,
         exclude_patterns: Optional[List[str]] = None,
-        progress_callback: Optional[ProgressCallback] = None
+        progress_callback: Optional[ProgressCallback] = None,
+        skip_unchanged: bool = False,
+        prune: bool = False,
+        jobs: int = 1,
+        names: Optional[List[str]] = None
     ) -> None:
         """
         Extract zip archive with optional filtering.
         
+        Members are streamed through a CHUNK_SIZE buffer, and progress is
+        reported by uncompressed bytes at most every PROGRESS_INTERVAL.
+        Every file written is recorded in the extraction index with its
+        size, mtime and CRC32.
+        
+        With several jobs, members are inflated and written by a thread
+        pool (zlib and file I/O release the GIL), each thread reading
+        through its own ZipFile handle. All directories are created first.
+        
         Args:
             archive_path: Path to zip file
             destination: Extraction destination directory
             include_patterns: Glob patterns to include (None = all)
             exclude_patterns: Glob patterns to exclude
             progress_callback: Function(progress: 0-1, message: str)
+            skip_unchanged: Leave files whose size and CRC32 already match
+            prune: Delete indexed files within the include/exclude scope
+                that are no longer in the archive
+            jobs: Worker threads (0 = one per CPU)
+            names: Only extract these members (None = all)
         """
-        exclude_patterns = exclude_patterns or []
+        include = archive.PathMatcher(include_patterns) if include_patterns else None
+        selected = set(names) if names is not None else None
+        exclude = archive.PathMatcher(exclude_patterns or [])
+        jobs = jobs or os.cpu_count() or 1
+
+        def in_scope(name: str) -> bool:
+            return (include is None or include.match(name)) and not exclude.match(name) \
+                and (selected is None or name in selected)
+
+        index = self._load_extract_index(destination)
 
         with zipfile.ZipFile(archive_path, "r") as zf:
-            members = zf.namelist()
-
-            # Apply include filter
-            if include_patterns:
-                members = [
-                    m for m in members
-                    if any(fnmatch.fnmatch(m, p) for p in include_patterns)
-                ]
-
-            # Apply exclude filter
-            members = [
-                m for m in members
-                if not any(fnmatch.fnmatch(m, p) for p in exclude_patterns)
-            ]
+            members = [info for info in zf.infolist() if in_scope(info.filename)]
+
+        files = [info for info in members if not info.is_dir()]
+
+        # Directories first, so workers never race to create them
+        directories = {destination / info.filename for info in members if info.is_dir()}
+        directories.update((destination / info.filename).parent for info in files)
+        for directory in sorted(directories):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        lock = threading.Lock()
+        local = threading.local()
+        handles: List[zipfile.ZipFile] = []
+
+        total_bytes = sum(info.file_size for info in files) or 1
+        done_bytes = 0
+        last_report = 0.0
+        message = ""
+        written = 0
+        unchanged = 0
+
+        def report() -> None:
+            nonlocal last_report
+            now = time.monotonic()
+            if progress_callback and now - last_report >= self.PROGRESS_INTERVAL:
+                last_report = now
+                progress_callback(done_bytes / total_bytes, message)
+
+        def on_bytes(num_bytes: int, text: str) -> None:
+            nonlocal done_bytes, message
+            with lock:
+                done_bytes += num_bytes
+                message = text
+            if jobs == 1:
+                report()
+
+        def extract_one(info: zipfile.ZipInfo) -> Optional[List[int]]:
+            target_path = destination / info.filename
+
+            if skip_unchanged and self._is_extracted(info, target_path, index):
+                on_bytes(info.file_size, f"Unchanged: {target_path.name}")
+                return None
+
+            zf = getattr(local, "zf", None)
+            if zf is None:
+                zf = local.zf = zipfile.ZipFile(archive_path, "r")
+                with lock:
+                    handles.append(zf)
+
+            with zf.open(info) as src, open(target_path, "wb") as dst:
+                while True:
+                    chunk = src.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    on_bytes(len(chunk), f"Extracting: {target_path.name}")
+
+            stat = target_path.stat()
+            return [stat.st_size, stat.st_mtime_ns, info.CRC]
+
+        def record(info: zipfile.ZipInfo, entry: Optional[List[int]]) -> None:
+            nonlocal written, unchanged
+            if entry is None:
+                unchanged += 1
+            else:
+                index[info.filename] = entry
+                written += 1
 
-            total = len(members)
+        try:
+            if jobs > 1 and len(files) > 1:
+                with ThreadPoolExecutor(max_workers=jobs) as pool:
+                    futures = {pool.submit(extract_one, info): info for info in files}
+                    pending = set(futures)
+                    try:
+                        while pending:
+                            finished, pending = wait(pending, timeout=self.PROGRESS_INTERVAL)
+                            for future in finished:
+                                record(futures[future], future.result())
+                            report()
+                    except BaseException:
+                        for future in pending:
+                            future.cancel()
+                        raise
+            else:
+                for info in files:
+                    record(info, extract_one(info))
+        finally:
+            for handle in handles:
+                handle.close()
+
+        removed = 0
+        if prune:
+            names = {info.filename for info in members}
+            stale = [name for name in index if name not in names and in_scope(name)]
+            removed = self._remove_extracted(destination, stale, index)
+
+        self._save_extract_index(index, destination)
+
+        if progress_callback:
+            progress_callback(1.0, f"Extracted {written} files")
+
+        logger.info(
+            f"Extracted {written} files to {destination} with {jobs} workers "
+            f"({unchanged} unchanged, {removed} removed)"
+        )
 
-            for i, member in enumerate(members):
-                if progress_callback:
-                    progress_callback(
-                        i / total if total > 0 else 1.0,
-                        f"Extracting: {Path(member).name}"
-                    )
+    def _is_extracted(
+        self,
+        info: zipfile.ZipInfo,
+        target_path: Path,
+        index: Dict[str, List[int]]
+    ) -> bool:
+        """
+        Check whether a member is already on disk unchanged.
+        
+        Trusts the index while the file's size and mtime still match it,
+        otherwise computes the CRC32 of the file once and re-indexes it.
+        
+        Args:
+            info: Archive member
+            target_path: Where the member would be extracted
+            index: Extraction index, updated in place
+            
+        Returns:
+            True if the file on disk matches the member
+        """
+        try:
+            stat = target_path.stat()
+        except OSError:
+            return False
 
-                target_path = destination / member
+        if stat.st_size != info.file_size:
+            return False
 
-                if member.endswith("/"):
-                    target_path.mkdir(parents=True, exist_ok=True)
-                else:
-                    target_path.parent.mkdir(parents=True, exist_ok=True)
-                    with zf.open(member) as src:
-                        target_path.write_bytes(src.read())
+        entry = index.get(info.filename)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2] == info.CRC
 
-            logger.info(f"Extracted {total} files to {destination}")
+        try:
+            if archive.file_crc32(target_path) != info.CRC:
+                return False
+        except OSError:
+            return False
+
+        index[info.filename] = [stat.st_size, stat.st_mtime_ns, info.CRC]
+        return True
 
-    def _post_install_setup(self) -> None:
+    def _remove_extracted(self, destination: Path, names: List[str], index: Dict[str, List[int]]) -> int:
+        """
+        Delete previously extracted files and any directories left empty.
+        
+        Args:
+            destination: Directory the files were extracted to
+            names: Member names to remove
+            index: Extraction index, updated in place
+            
+        Returns:
+            Number of files deleted
+        """
+        removed = 0
+
+        for name in names:
+            file_path = destination / name
+            try:
+                file_path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove {file_path}: {e}")
+                continue
+
+            del index[name]
+
+            parent = file_path.parent
+            while parent != destination:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+
+        return removed
+
+    def _extract_index_path(self, destination: Path) -> Path:
+        """Get the extraction index for a tree laid out like special://home."""
+        return destination / self.extract_index_path.relative_to(self.kodi_home)
+
+    def _load_extract_index(self, destination: Path) -> Dict[str, List[int]]:
+        """
+        Load the record of files extracted from builds.
+        
+        Args:
+            destination: Tree the files were extracted to
+            
+        Returns:
+            Dict mapping member name to [size, mtime_ns, crc32]
+        """
+        try:
+            return json.loads(self._extract_index_path(destination).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_extract_index(self, index: Dict[str, List[int]], destination: Path) -> None:
+        index_path = self._extract_index_path(destination)
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = index_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(index, separators=(",", ":")), encoding="utf-8")
+            tmp_path.replace(index_path)
+        except OSError as e:
+            logger.warning(f"Could not save extraction index: {e}")
+
+    def _install_staged(
+        self,
+        archive_path: Path,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> None:
+        """
+        Extract a build into a staging tree and rename it into place.
+        
+        The build is split into units: each add-on directory, and each
+        other file, so settings and databases the build does not ship stay
+        where they are. Every live unit the build replaces is renamed into
+        the rollback tree and the staged one renamed in, so no unit is ever
+        half-written. If a rename fails the swap is undone.
+        
+        Args:
+            archive_path: Build zip
+            progress_callback: Function(progress: 0-1, message: str)
+        """
+        staging = self.kodi_home / self.STAGING_DIR
+        rollback = self.kodi_home / self.ROLLBACK_DIR
+
+        # Only the latest install can be rolled back
+        for path in (staging, rollback, self.kodi_home / self.DISCARD_DIR):
+            if path.exists():
+                shutil.rmtree(path)
+
+        self._extract_archive(
+            archive_path,
+            staging,
+            progress_callback=progress_callback,
+            jobs=config.EXTRACT_WORKERS
+        )
+
+        with zipfile.ZipFile(archive_path, "r") as zf:
+            units = sorted({
+                self._install_unit(info.filename)
+                for info in zf.infolist() if not info.is_dir()
+            })
+
+        meta = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "version": self._load_install_state().get("version", ""),
+            "units": {unit: (self.kodi_home / unit).exists() for unit in units},
+        }
+        rollback.mkdir(parents=True)
+        (rollback / "rollback.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        if self.extract_index_path.exists():
+            shutil.copy2(self.extract_index_path, rollback / self.extract_index_path.name)
+
+        # The staged index lives in no unit; carry it over after the swap
+        index = self._load_extract_index(staging)
+
+        if progress_callback:
+            progress_callback(1.0, f"Swapping in {len(units)} components...")
+
+        try:
+            for unit, existed in meta["units"].items():
+                if existed:
+                    self._move(self.kodi_home / unit, rollback / unit)
+                self._move(staging / unit, self.kodi_home / unit)
+        except OSError:
+            logger.exception("Swap failed; restoring previous installation")
+            self._restore_units(meta["units"], rollback)
+            shutil.rmtree(rollback, ignore_errors=True)
+            raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self._save_extract_index(index, self.kodi_home)
+        logger.info(f"Installed {len(units)} components; previous versions kept in {rollback}")
+
+    def rollback_install(self) -> None:
+        """
+        Put back the add-ons and settings replaced by the last fresh install.
+        """
+        dialog = xbmcgui.Dialog()
+        rollback = self.kodi_home / self.ROLLBACK_DIR
+
+        try:
+            meta = json.loads((rollback / "rollback.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            dialog.ok("Roll Back", "There is no previous installation to roll back to.")
+            return
+
+        created = meta.get("created", "").replace("T", " ")
+        previous = meta.get("version") or "the previous setup"
+        if not dialog.yesno(
+            "Roll Back",
+            f"Restore {previous} as it was before the install on {created}?\n\n"
+            "Add-ons and settings installed since will be removed."
+        ):
+            return
+
+        addon_versions = self._addon_versions()
+
+        try:
+            self._restore_units(meta.get("units", {}), rollback)
+
+            saved_index = rollback / self.extract_index_path.name
+            if saved_index.exists():
+                self._move(saved_index, self.extract_index_path)
+            elif self.extract_index_path.exists():
+                self.extract_index_path.unlink()
+
+            shutil.rmtree(rollback, ignore_errors=True)
+        except OSError as e:
+            logger.exception("Rollback failed")
+            dialog.ok("Rollback Failed", str(e))
+            return
+
+        self._refresh_addon_database(addon_versions)
+
+        if dialog.yesno(
+            "Rollback Complete",
+            "The previous installation has been restored.\n\n"
+            "Kodi must restart to apply changes.\n"
+            "Restart now?"
+        ):
+            xbmc.executebuiltin("RestartApp")
+
+    def _restore_units(self, units: Dict[str, bool], rollback: Path) -> None:
+        """
+        Move units back from the rollback tree.
+        
+        Safe to run after a partial swap: units that were never moved are
+        left alone, and units that did not exist before are removed only
+        if they were swapped in.
+        
+        Args:
+            units: Unit path -> whether it existed before the install
+            rollback: Rollback tree holding the replaced units
+        """
+        discard = self.kodi_home / self.DISCARD_DIR
+
+        for unit, existed in units.items():
+            live = self.kodi_home / unit
+            saved = rollback / unit
+
+            if existed and not saved.exists():
+                continue
+
+            if live.exists():
+                self._move(live, discard / unit)
+            if existed:
+                self._move(saved, live)
+
+        shutil.rmtree(discard, ignore_errors=True)
+        logger.info(f"Restored {len(units)} components from {rollback}")
+
+    @staticmethod
+    def _install_unit(name: str) -> str:
+        """
+        Get the unit of a build member that is swapped as a whole.
+        
+        addons/<id> is replaced as a directory so stale add-on files go;
+        anything else, e.g. userdata/addon_data/<id>/settings.xml, is
+        replaced file by file so user files beside it are kept.
+        """
+        parts = name.split("/")
+        if parts[0] == "addons" and len(parts) > 2:
+            return "/".join(parts[:2])
+        return name
+
+    @staticmethod
+    def _move(source: Path, target: Path) -> None:
+        """Rename a file or directory, replacing anything left at the target."""
+        if target.is_dir():
+            shutil.rmtree(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+
+    def _post_install_setup(self, addon_versions: Optional[Dict[str, str]] = None) -> None:
         """
         Run post-installation configuration tasks.
         Sets default skin and refreshes addon database.
+        
+        Args:
+            addon_versions: Add-on versions from before the install
         """
         # Set Fentastic as default skin in guisettings.xml
         guisettings = self.kodi_home / "userdata" / "guisettings.xml"
 
         if guisettings.exists():
             try:
-                tree = ET.parse(guisettings)
-                root = tree.getroot()
-
-                # Find or create skin setting
-                skin_elem = root.find(".//setting[@id='lookandfeel.skin']")
-                if skin_elem is not None:
-                    skin_elem.text = config.FENTASTIC_ID
-                else:
-                    setting = ET.SubElement(root, "setting", id="lookandfeel.skin")
-                    setting.text = config.FENTASTIC_ID
-
-                tree.write(guisettings, encoding="unicode", xml_declaration=True)
-                logger.info("Updated guisettings.xml with Fentastic skin")
+                doc = settingsdoc.SettingsDocument.load(guisettings)
+                doc.set("lookandfeel.skin", config.FENTASTIC_ID)
+                if doc.save():
+                    logger.info("Updated guisettings.xml with Fentastic skin")
 
             except ET.ParseError as e:
                 logger.warning(f"Failed to parse guisettings.xml: {e}")
 
-        # Force addon database refresh
-        self._refresh_addon_database()
+        # Record changed add-ons in the addon database
+        self._refresh_addon_database(addon_versions)
 
-    def _refresh_addon_database(self) -> None:
-        """Delete addon database to force Kodi to rescan add-ons."""
-        db_dir = self.kodi_home / "userdata" / "Database"
+    def _addon_versions(self) -> Dict[str, str]:
+        """
+        Read the ID and version of every installed add-on.
+        
+        Only the root element of each addon.xml is parsed.
+        
+        Returns:
+            Dict of addon ID -> version
+        """
+        versions: Dict[str, str] = {}
+        addons_dir = self.kodi_home / "addons"
+
+        if not addons_dir.is_dir():
+            return versions
+
+        for addon_xml in addons_dir.glob("*/addon.xml"):
+            try:
+                with open(addon_xml, "rb") as f:
+                    _, root = next(ET.iterparse(f, events=("start",)))
+            except (ET.ParseError, OSError, StopIteration):
+                continue
+
+            addon_id = root.get("id")
+            if addon_id:
+                versions[addon_id] = root.get("version", "")
+
+        return versions
+
+    def _refresh_addon_database(self, previous_versions: Optional[Dict[str, str]] = None) -> None:
+        """
+        Bring Kodi's addon database in line with the add-ons on disk.
         
+        Given the versions from before an install, only add-ons that are
+        new, changed version or were removed are written to Addons<N>.db,
+        keeping enabled states and repository data. Otherwise, or if that
+        fails, the database is deleted so Kodi rescans every add-on.
+        
+        Args:
+            previous_versions: Result of _addon_versions before the change
+        """
+        db_dir = self.kodi_home / "userdata" / "Database"
+
+        if config.ADDON_DB_INCREMENTAL and previous_versions is not None:
+            db_path = database.latest_database(db_dir, "Addons")
+            if db_path is None:
+                # Kodi creates it on the next start
+                return
+
+            current = self._addon_versions()
+            changed = [addon_id for addon_id, version in current.items() if previous_versions.get(addon_id) != version]
+            removed = [addon_id for addon_id in previous_versions if addon_id not in current]
+
+            try:
+                database.AddonDatabase(db_path).sync(changed, removed)
+                return
+            except sqlite3.Error as e:
+                logger.warning(f"Could not update {db_path.name} in place, forcing a rescan: {e}")
+
         for db_file in db_dir.glob("Addons*.db"):
             try:
                 db_file.unlink()
@@ -708,45 +1827,143 @@ class BuildWizard:
         """
         Write or update Kodi settings XML file.
         
+        The file is parsed once, all settings are applied, and it is
+        replaced atomically, and only if a value changed.
+        
         Args:
             path: Path to settings.xml
             settings: Dictionary of setting_id -> value
             merge: If True, merge with existing settings
         """
-        if merge and path.exists():
+        doc = None
+        if merge:
             try:
-                tree = ET.parse(path)
-                root = tree.getroot()
-            except ET.ParseError:
-                root = ET.Element("settings", version="2")
-                tree = ET.ElementTree(root)
-        else:
-            root = ET.Element("settings", version="2")
-            tree = ET.ElementTree(root)
+                doc = settingsdoc.SettingsDocument.load(path)
+            except ET.ParseError as e:
+                logger.warning(f"Replacing unreadable {path}: {e}")
 
-        for setting_id, value in settings.items():
-            elem = root.find(f".//setting[@id='{setting_id}']")
-            if elem is None:
-                elem = ET.SubElement(root, "setting", id=setting_id)
-            elem.text = value
+        if doc is None:
+            doc = settingsdoc.SettingsDocument(path)
 
-        path.parent.mkdir(parents=True, exist_ok=True)
-        tree.write(path, encoding="unicode", xml_declaration=True)
+        doc.update(settings)
+        doc.save()
 
-    def _should_exclude(self, path: Path) -> bool:
+    def _plan_backup(self) -> Dict[str, object]:
         """
-        Check if path should be excluded from backup.
+        Sort backup candidates into precious and regenerable data.
+        
+        Regenerable data is anything matching config.BACKUP_REGENERABLE,
+        such as thumbnails, the texture database and scraper caches.
+        
+        Returns:
+            Dict with "precious": [(path, relative name, stat)] and
+            "regenerable": {category: [(path, relative name, stat)]}
+        """
+        matchers = {
+            category: archive.PathMatcher(patterns)
+            for category, patterns in config.BACKUP_REGENERABLE.items()
+        }
+        precious: List[Tuple[Path, str, os.stat_result]] = []
+        regenerable: Dict[str, List[Tuple[Path, str, os.stat_result]]] = {
+            category: [] for category in matchers
+        }
+
+        for dir_name in config.BACKUP_DIRS:
+            source_dir = self.kodi_home / dir_name
+            if not source_dir.is_dir():
+                continue
+
+            for entry, rel_path in archive.walk_files(source_dir, f"{dir_name}/"):
+                try:
+                    item = (Path(entry.path), rel_path, entry.stat())
+                except OSError:
+                    continue
+
+                category = next(
+                    (name for name, matcher in matchers.items() if matcher.match(rel_path)),
+                    None
+                )
+                if category is None:
+                    precious.append(item)
+                else:
+                    regenerable[category].append(item)
+
+        return {"precious": precious, "regenerable": regenerable}
+
+    def _confirm_backup(
+        self,
+        dialog: xbmcgui.Dialog,
+        plan: Dict[str, object],
+        previous: Optional[Dict[str, object]] = None
+    ) -> Optional[List[Tuple[Path, str]]]:
+        """
+        Show what a backup will contain, its size and estimated time.
         
         Args:
-            path: Path to check
+            dialog: Dialog to ask with
+            plan: Result of _plan_backup
+            previous: Last snapshot manifest; its unchanged files cost
+                nothing and its measured rate drives the estimate
             
         Returns:
-            True if path matches exclusion patterns
+            (path, relative name) pairs to back up, or None if cancelled
         """
-        path_str = str(path)
-        
-        for pattern in config.BUILD_EXCLUDE_PATTERNS:
-            if fnmatch.fnmatch(path_str, pattern):
-                return True
-                
-        return False
+        previous = previous or {}
+        previous_files = previous.get("files", {})
+        rate = previous.get("rate") or config.BACKUP_ESTIMATE_RATE
+        mb = 1024 * 1024
+
+        def estimate(items) -> str:
+            size = sum(stat.st_size for _, _, stat in items)
+            to_read = sum(
+                stat.st_size for _, rel_path, stat in items
+                if previous_files.get(rel_path, [None, None])[:2] != [stat.st_size, stat.st_mtime_ns]
+            )
+            seconds = to_read / rate
+            duration = f"{max(1, round(seconds))} s" if seconds < 60 else f"{round(seconds / 60)} min"
+            return f"{len(items)} files, {size / mb:.1f} MB, about {duration}"
+
+        precious = plan["precious"]
+        skipped = [(category, items) for category, items in plan["regenerable"].items() if items]
+        everything = precious + [item for _, items in skipped for item in items]
+
+        lines = [f"Settings, accounts and watch history: {estimate(precious)}"]
+        if skipped:
+            lines += ["", "Skipping data Kodi rebuilds on its own:"]
+            lines += [
+                f"- {category}: {len(items)} files, "
+                f"{sum(stat.st_size for _, _, stat in items) / mb:.1f} MB"
+                for category, items in skipped
+            ]
+            choice = dialog.yesnocustom(
+                "Backup Plan",
+                "\n".join(lines),
+                customlabel="Include Everything",
+                yeslabel="Back Up",
+                nolabel="Cancel"
+            )
+        else:
+            choice = 1 if dialog.yesno(
+                "Backup Plan",
+                "\n".join(lines),
+                yeslabel="Back Up",
+                nolabel="Cancel"
+            ) else 0
+
+        if choice == 1:
+            selected = precious
+        elif choice == 2:
+            selected = everything
+            logger.info(f"Backing up everything: {estimate(everything)}")
+        else:
+            return None
+
+        return [(file_path, rel_path) for file_path, rel_path, _ in selected]
+
+    def _snapshot_store(self) -> snapshots.SnapshotStore:
+        """Get the deduplicated backup store under special://home/backups."""
+        policy = archive.CompressionPolicy(
+            default_level=config.BACKUP_COMPRESS_LEVEL,
+            levels={}
+        )
+        return snapshots.SnapshotStore(self.kodi_home / "backups", policy)
@@ -6,7 +6,7 @@ Packages a configured Kodi installation into a distributable build zip
 with Fentastic, FenLight, and CocoScrapers preconfigured.
 
 Usage:
-    python package_build.py <kodi_home> <output_dir> [--name NAME] [--version VERSION]
+    python package_build.py <kodi_home> <output_dir> [--name NAME] [--version VERSION] [--reproducible] [--jobs N]
 
 Example:
     python package_build.py ~/.kodi ./builds --name jodisbuild --version 1.0.0
@@ -18,17 +18,27 @@ Example:
 from __future__ import annotations
 
 import argparse
-import fnmatch
 import hashlib
+import json
+import os
 import shutil
 import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict
-import xml.etree.ElementTree as ET
+from typing import List, Dict, Optional
 import logging
 import sys
 
+# Shared archive and settings helpers live in the wizard library
+WIZARD_LIB = Path(__file__).resolve().parent.parent / "omega" / "plugin.program.jodisbuildwizard" / "resources" / "lib"
+sys.path.insert(0, str(WIZARD_LIB))
+
+import archive  # noqa: E402
+import settingsdoc  # noqa: E402
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -71,15 +81,27 @@ EXCLUDE_PATTERNS = [
     "*/.DS_Store",
     "*/Thumbs.db",
     "*/peripheral_data/*",
+    *archive.WIZARD_STATE_MEMBERS,
 ]
 
 
+EXCLUDE_MATCHER = archive.PathMatcher(EXCLUDE_PATTERNS)
+
+# Store already-compressed media, deflate text at a higher level
+COMPRESSION = archive.CompressionPolicy()
+
+# Larger files stream through zipfile instead of being deflated in memory
+IN_MEMORY_MAX_FILE_SIZE = 32 * 1024 * 1024
+
+# Source bytes being deflated ahead of the writer, across all workers.
+# Each in-memory member holds its input and output, so this bounds peak
+# memory however many jobs run.
+PREFETCH_BYTES = 128 * 1024 * 1024
+
+
 def should_exclude(path: str) -> bool:
     """Check if path matches any exclusion pattern."""
-    for pattern in EXCLUDE_PATTERNS:
-        if fnmatch.fnmatch(path, pattern):
-            return True
-    return False
+    return EXCLUDE_MATCHER.match(path)
 
 
 def validate_kodi_home(kodi_home: Path) -> bool:
@@ -130,8 +152,6 @@ def generate_guisettings(output_path: Path) -> None:
     Args:
         output_path: Path to write guisettings.xml
     """
-    root = ET.Element("settings", version="2")
-
     settings = {
         "lookandfeel.skin": "skin.fentastic",
         "lookandfeel.skinzoom": "0",
@@ -142,14 +162,9 @@ def generate_guisettings(output_path: Path) -> None:
         "videoplayer.usedisplayasclock": "true",
     }
 
-    for setting_id, value in settings.items():
-        ET.SubElement(root, "setting", id=setting_id).text = value
-
-    tree = ET.ElementTree(root)
-    ET.indent(tree, space="    ")
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    tree.write(output_path, encoding="unicode", xml_declaration=True)
+    doc = settingsdoc.SettingsDocument(output_path)
+    doc.update(settings)
+    doc.save(indent="    ")
     logger.info(f"Generated: guisettings.xml")
 
 
@@ -215,20 +230,181 @@ def generate_addon_settings(addon_data_dir: Path) -> None:
 
 def write_settings_xml(path: Path, settings: Dict[str, str]) -> None:
     """Write Kodi settings XML file."""
-    root = ET.Element("settings", version="2")
+    doc = settingsdoc.SettingsDocument(path)
+    doc.update(settings)
+    doc.save()
+
+
+def publish_alias(source: Path, alias: Path) -> None:
+    """
+    Atomically point alias at source without copying the data.
+    
+    Uses a hardlink where the filesystem allows it and falls back to a
+    copy; either way the alias is swapped in with a rename, so readers
+    never see a missing or partial file.
+    
+    Args:
+        source: Published file
+        alias: Alias path, e.g. jodisbuild-latest.zip
+    """
+    # rename() is a no-op when both names are already the same file
+    if alias.exists() and os.path.samefile(source, alias):
+        return
+
+    tmp_path = alias.with_name(alias.name + ".tmp")
+
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+
+    os.replace(tmp_path, alias)
+
+
+def run_inline(fn, *args) -> Future:
+    """Run fn now and wrap the outcome in a completed Future."""
+    future: Future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def write_members(
+    zf: zipfile.ZipFile,
+    files_to_add: List[tuple],
+    stats: archive.CompressionStats,
+    date_time: Optional[tuple] = None,
+    jobs: int = 1
+) -> List[Dict[str, object]]:
+    """
+    Write files to the archive, deflating them across worker processes.
+    
+    Members are deflated in memory (in a pool when jobs > 1) and appended
+    as pre-compressed entries in input order, so the archive is identical
+    for any jobs value. Stored and very large files stream directly.
+    
+    Source files that cannot be read are skipped with a warning. Errors
+    writing the archive propagate, so a broken archive is never published.
+    
+    Args:
+        zf: Archive open for writing
+        files_to_add: (file path, archive path) tuples
+        stats: Compression stats collector
+        date_time: Reproducible member timestamp, or None
+        jobs: Worker processes for deflating
+        
+    Returns:
+        Manifest entries for the written members, in archive order
+    """
+    pool_context = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else nullcontext()
+    entries: List[Dict[str, object]] = []
 
-    for setting_id, value in settings.items():
-        ET.SubElement(root, "setting", id=setting_id).text = value
+    with pool_context as pool:
+        submit = pool.submit if pool is not None else run_inline
+        pending: deque = deque()
+        in_flight = 0
 
-    tree = ET.ElementTree(root)
-    tree.write(path, encoding="unicode", xml_declaration=True)
+        def write_next() -> None:
+            nonlocal in_flight
+            file_path, arc_path, future, held = pending.popleft()
+            in_flight -= held
+
+            # Only reading the source may fail softly; writing must not
+            try:
+                if future is None:
+                    open(file_path, "rb").close()
+                else:
+                    crc, size, data, sha256, seconds = future.result()
+            except OSError as e:
+                logger.warning(f"Could not add {os.fspath(file_path)}: {e}")
+                return
+
+            if future is None:
+                digest = hashlib.sha256()
+                zinfo = archive.write_member(
+                    zf, file_path, arc_path, COMPRESSION, stats, date_time, digest
+                )
+                sha256 = digest.hexdigest()
+            else:
+                zinfo = archive.make_zip_info(file_path, arc_path, date_time)
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                zinfo.CRC = crc
+                zinfo.file_size = size
+                archive.write_compressed(zf, zinfo, data)
+                stats.record(zinfo, file_path, seconds)
+
+            entries.append(archive.manifest_entry(arc_path, zinfo.file_size, zinfo.CRC, sha256))
+
+        for file_path, arc_path in files_to_add:
+            compress_type, compress_level = COMPRESSION.select(arc_path)
+            future = None
+
+            try:
+                size = os.stat(file_path).st_size
+            except OSError as e:
+                logger.warning(f"Could not add {os.fspath(file_path)}: {e}")
+                continue
+
+            if compress_type != zipfile.ZIP_DEFLATED or size > IN_MEMORY_MAX_FILE_SIZE:
+                size = 0  # Streamed when written, nothing held
+            else:
+                # Write members out until this one fits in the window
+                while pending and in_flight + size > PREFETCH_BYTES:
+                    write_next()
+                future = submit(archive.compress_file, os.fspath(file_path), compress_level)
+
+            pending.append((file_path, arc_path, future, size))
+            in_flight += size
+
+        while pending:
+            write_next()
+
+    return entries
+
+
+def write_text_atomic(path: Path, content: str) -> None:
+    """
+    Write text via a temp file and rename so readers never see a partial
+    file, and any hardlinked alias keeps the previous version.
+    
+    Args:
+        path: Destination path
+        content: File contents
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(content, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def write_json_atomic(path: Path, data: Dict[str, object], compact: bool = False) -> None:
+    """
+    Write JSON atomically (see write_text_atomic).
+    
+    Args:
+        path: Destination path
+        data: JSON-serialisable data
+        compact: Omit indentation (for large manifests)
+    """
+    if compact:
+        content = json.dumps(data, separators=(",", ":"), sort_keys=True)
+    else:
+        content = json.dumps(data, indent=2, sort_keys=True)
+
+    write_text_atomic(path, content + "\n")
 
 
 def package_build(
     kodi_home: Path,
     output_dir: Path,
     build_name: str,
-    version: str
+    version: str,
+    reproducible: bool = False,
+    jobs: int = 1
 ) -> Path:
     """
     Create build package from Kodi home directory.
@@ -238,6 +414,9 @@ def package_build(
         output_dir: Output directory for build zip
         build_name: Build name for zip filename
         version: Build version string
+        reproducible: Write members in sorted order with normalised
+            timestamps, permissions and compression level
+        jobs: Worker processes for deflating members
         
     Returns:
         Path to created build zip
@@ -275,58 +454,98 @@ def package_build(
             logger.warning(f"Directory not found: {dir_pattern}")
             continue
 
-        for file_path in source_dir.rglob("*"):
-            if not file_path.is_file():
-                continue
-
-            rel_path = file_path.relative_to(kodi_home)
-            rel_path_str = str(rel_path).replace("\\", "/")
-
-            if should_exclude(rel_path_str):
-                continue
-
-            files_to_add.append((file_path, rel_path))
+        # Excluded directories are pruned without being descended into
+        files_to_add.extend(
+            archive.walk_files(source_dir, f"{dir_pattern}/", EXCLUDE_MATCHER)
+        )
 
     # Also include guisettings.xml
     if guisettings.exists():
         rel_path = guisettings.relative_to(kodi_home)
-        files_to_add.append((guisettings, rel_path))
+        files_to_add.append((guisettings, str(rel_path).replace("\\", "/")))
 
     logger.info(f"Packaging {len(files_to_add)} files...")
 
-    # Create zip archive
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        for file_path, arc_path in files_to_add:
-            try:
-                zf.write(file_path, arc_path)
-            except (OSError, PermissionError) as e:
-                logger.warning(f"Could not add {file_path}: {e}")
+    stats = archive.CompressionStats()
+    date_time = None
+
+    if reproducible:
+        files_to_add.sort(key=lambda f: f[1])
+        date_time = archive.reproducible_date_time()
+
+    # Write to a .part file, hashing as the archive streams to disk
+    part_path = zip_path.with_name(zip_path.name + ".part")
+
+    try:
+        with open(part_path, "wb") as raw:
+            writer = archive.HashingWriter(raw)
+
+            with zipfile.ZipFile(writer, "w", zipfile.ZIP_DEFLATED) as zf:
+                entries = write_members(zf, files_to_add, stats, date_time, jobs)
+
+                manifest = {
+                    "format": archive.MANIFEST_FORMAT,
+                    "name": build_name,
+                    "version": version,
+                    "files": entries,
+                }
+                manifest_json = json.dumps(manifest, separators=(",", ":"), sort_keys=True)
+
+                # Embedded as the last member so an installed build knows its contents
+                manifest_info = zipfile.ZipInfo(
+                    archive.MANIFEST_MEMBER,
+                    date_time or datetime.now().timetuple()[:6]
+                )
+                compress_type, compress_level = COMPRESSION.select(archive.MANIFEST_MEMBER)
+                zf.writestr(manifest_info, manifest_json, compress_type, compress_level)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(part_path, zip_path)
+
+    logger.info(f"Compression: {stats.summary()}")
 
     zip_size = zip_path.stat().st_size / (1024 * 1024)
     logger.info(f"Created: {zip_path.name} ({zip_size:.1f} MB)")
 
-    # Generate MD5 checksum
-    with open(zip_path, "rb") as f:
-        md5_hash = hashlib.md5(f.read()).hexdigest()
+    md5_hash = writer.hexdigest("md5")
+    sha256_hash = writer.hexdigest("sha256")
 
     checksum_path = zip_path.with_suffix(".zip.md5")
-    checksum_path.write_text(f"{md5_hash}  {zip_path.name}\n")
-    logger.info(f"Checksum: {md5_hash}")
+    write_text_atomic(checksum_path, f"{md5_hash}  {zip_path.name}\n")
+    sha256_path = zip_path.with_suffix(".zip.sha256")
+    write_text_atomic(sha256_path, f"{sha256_hash}  {zip_path.name}\n")
+    logger.info(f"Checksum: {md5_hash} (SHA-256 {sha256_hash})")
 
-    # Create "latest" copy
-    latest_zip = output_dir / f"{build_name}-latest.zip"
-    latest_md5 = output_dir / f"{build_name}-latest.zip.md5"
+    manifest_path = zip_path.with_suffix(".manifest.json")
+    write_json_atomic(manifest_path, manifest, compact=True)
+    logger.info(f"Manifest: {manifest_path.name} ({len(entries)} files)")
 
-    if latest_zip.exists():
-        latest_zip.unlink()
-    if latest_md5.exists():
-        latest_md5.unlink()
+    # Point "latest" aliases at this build
+    latest_zip = output_dir / f"{build_name}-latest.zip"
 
-    shutil.copy2(zip_path, latest_zip)
-    shutil.copy2(checksum_path, latest_md5)
+    publish_alias(zip_path, latest_zip)
+    publish_alias(checksum_path, output_dir / f"{build_name}-latest.zip.md5")
+    publish_alias(sha256_path, output_dir / f"{build_name}-latest.zip.sha256")
+    publish_alias(manifest_path, output_dir / f"{build_name}-latest.manifest.json")
 
     logger.info(f"Created: {latest_zip.name}")
 
+    # Small index clients poll to find the current build
+    channel_path = output_dir / f"{build_name}-channel.json"
+    write_json_atomic(channel_path, {
+        "format": archive.MANIFEST_FORMAT,
+        "name": build_name,
+        "version": version,
+        "archive": zip_path.name,
+        "size": zip_path.stat().st_size,
+        "md5": md5_hash,
+        "sha256": sha256_hash,
+        "manifest": manifest_path.name,
+    })
+    logger.info(f"Channel: {channel_path.name} (v{version})")
+
     return zip_path
 
 
@@ -365,6 +584,18 @@ Examples:
         default="1.0.0",
         help="Build version (default: 1.0.0)"
     )
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Write a byte-stable zip (sorted members, fixed timestamps; "
+             "honours SOURCE_DATE_EPOCH)"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=archive.job_count,
+        default=1,
+        help="Worker processes for compression (0 = all CPUs, default: 1)"
+    )
 
     args = parser.parse_args()
 
@@ -382,7 +613,9 @@ Examples:
             args.kodi_home,
             args.output_dir,
             args.name,
-            args.version
+            args.version,
+            reproducible=args.reproducible,
+            jobs=args.jobs
         )
         return 0
         